@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.asset import AssetBlob
+
+# next to the local upload root, so saving to LocalStorage is a rename
+TMP_DIR = Path("storage/tmp")
+
+
+def storage_key(digest: str, ext: str) -> str:
+    # two-character fan-out keeps directories small
+    return f"{digest[:2]}/{digest}{ext}"
+
+
+# The existing blob for `digest`; None if the content is new.
+async def find_blob(db: AsyncSession, digest: str) -> AssetBlob | None:
+    return await db.get(AssetBlob, digest)
+
+
+# The blob for `digest`, created on first sight. Returns the blob and whether
+# this call created it.
+async def acquire_blob(
+    db: AsyncSession,
+    digest: str,
+    key: str,
+    content_type: str,
+    size: int,
+) -> tuple[AssetBlob, bool]:
+    blob = await db.get(AssetBlob, digest)
+    if blob is not None:
+        return blob, False
+    created = False
+    try:
+        async with db.begin_nested():
+            db.add(AssetBlob(digest=digest, storage_key=key, content_type=content_type, size=size))
+        created = True
+    except IntegrityError:
+        # a concurrent upload of the same bytes inserted it first
+        pass
+
+    blob = await db.get(AssetBlob, digest, populate_existing=True)
+    assert blob is not None
+    return blob, created
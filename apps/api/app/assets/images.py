@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from pathlib import Path
+import posixpath
+import tempfile
+from typing import Any
+
+from PIL import Image, ImageOps
+from sqlalchemy import update
+
+from app.assets.storage import storage
+from app.core.config import settings
+from app.core.versions import ASSETS, versions
+from app.db.models.asset import Asset, AssetBlob
+from app.db.session import SessionLocal
+
+log = logging.getLogger(__name__)
+
+WEBP_QUALITY = 80
+EXIF_ORIENTATION = 0x0112
+
+
+def _cells(pixels: int) -> int:
+    return max(1, round(pixels / settings.ASSET_CELL_PX))
+
+
+# Decodes the upload once and writes one WebP per configured size into
+# `out_dir`, largest first so each smaller variant is resampled from the
+# previous one. Sizes at or above the original collapse into a single
+# full-size WebP. Returns the original size and (path, width, height) per
+# variant, smallest first.
+def render_variants(src: Path, out_dir: Path, stem: str) -> tuple[int, int, list[tuple[Path, int, int]]]:
+    sizes = sorted(set(settings.ASSET_VARIANT_SIZES), reverse=True)
+    with Image.open(src) as opened:
+        width, height = opened.size
+        if opened.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEG can decode straight to a reduced scale
+        opened.draft("RGB", (sizes[0], sizes[0]))
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants: list[tuple[Path, int, int]] = []
+    for size in sizes:
+        if max(image.size) > size:
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        elif variants:
+            # already covered by a larger entry of the same dimensions
+            continue
+        path = out_dir / f"{stem}-{max(image.size)}.webp"
+        image.save(path, "WEBP", quality=WEBP_QUALITY, method=4)
+        variants.append((path, image.size[0], image.size[1]))
+
+    variants.reverse()
+    return width, height, variants
+
+
+def cells(width: int | None, height: int | None) -> tuple[int | None, int | None]:
+    if not width or not height:
+        return None, None
+    return _cells(width), _cells(height)
+
+
+def _store_variants(digest: str, key: str) -> tuple[int | None, int | None, list[dict[str, Any]]]:
+    # variants live next to the original
+    prefix = posixpath.dirname(key)
+    with storage.open_local(key) as src, tempfile.TemporaryDirectory(prefix="variants-") as out_dir:
+        try:
+            width, height, rendered = render_variants(src, Path(out_dir), digest)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # undecodable upload: keep the original only and don't retry
+            log.warning("Could not process image %s.", digest, exc_info=True)
+            return None, None, []
+
+        variants: list[dict[str, Any]] = []
+        for path, variant_width, variant_height in rendered:
+            variant_key = posixpath.join(prefix, path.name)
+            storage.save(path, variant_key, "image/webp")
+            variants.append({"width": variant_width, "height": variant_height, "url": storage.url(variant_key)})
+        return width, height, variants
+
+
+def process_blob(digest: str, key: str) -> bool:
+    width, height, variants = _store_variants(digest, key)
+
+    db = SessionLocal()
+    try:
+        blob = db.get(AssetBlob, digest)
+        if blob is None:
+            return False
+        blob.width, blob.height, blob.variants = width, height, variants
+        width_cells, height_cells = cells(width, height)
+        if width_cells is not None:
+            # every asset sharing these bytes that was created before this finished
+            db.execute(
+                update(Asset)
+                .where(Asset.blob_digest == digest, Asset.width_cells.is_(None))
+                .values(width_cells=width_cells, height_cells=height_cells)
+            )
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+# Image work is CPU-bound and can be slow for large maps, so it runs on its own
+# small pool after the upload response instead of on the request path.
+class ImagePipeline:
+    def __init__(self, workers: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="images")
+        self._pending: set[asyncio.Task[None]] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, digest: str, key: str) -> None:
+        task = asyncio.create_task(self._run(digest, key))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _run(self, digest: str, key: str) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            updated = await loop.run_in_executor(self._executor, process_blob, digest, key)
+        except Exception:
+            log.exception("Image pipeline failed for %s.", digest)
+            return
+        if updated:
+            await versions.bump(ASSETS)
+
+    async def stop(self) -> None:
+        # let in-flight uploads finish so their rows don't stay unprocessed
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+
+pipeline = ImagePipeline(settings.ASSET_PIPELINE_WORKERS)
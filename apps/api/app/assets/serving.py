@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+import mimetypes
+import os
+from pathlib import Path
+import re
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.assets.storage import IMMUTABLE_CACHE_CONTROL
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+# sibling files tried in order when the client accepts the encoding
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    # single ranges only; anything else is served in full, which RFC 9110 allows
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        return None
+    return start, end
+
+
+async def _read_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+# Serves LocalStorage. Stored names never change (content hash, or a uuid for
+# older uploads), so responses are cacheable forever and the name itself is a
+# strong ETag. Supports single byte ranges, .br/.gz siblings and, behind
+# nginx, handing the transfer off with X-Accel-Redirect.
+class UploadFiles:
+    def __init__(self, root: Path, accel_redirect_prefix: str | None = None) -> None:
+        self.root = root.resolve()
+        self.accel_redirect_prefix = accel_redirect_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request = Request(scope, receive)
+        response = await anyio.to_thread.run_sync(self._respond, request)
+        await response(scope, receive, send)
+
+    def _resolve(self, key: str) -> Path | None:
+        if not key or any(part.startswith(".") for part in key.split("/")):
+            # dot-prefixed names are temp and partial files (see LocalStorage.save)
+            return None
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root) or not path.is_file():
+            return None
+        return path
+
+    def _respond(self, request: Request) -> Response:
+        if request.method not in ("GET", "HEAD"):
+            return PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        # the mount's prefix is in root_path; what follows is the storage key
+        key = request.scope["path"][len(request.scope.get("root_path", "")) :]
+        path = self._resolve(key.lstrip("/"))
+        if path is None:
+            return PlainTextResponse("Not Found", status_code=404)
+
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            "X-Content-Type-Options": "nosniff",
+            "Accept-Ranges": "bytes",
+            "Vary": "Accept-Encoding",
+        }
+
+        if self.accel_redirect_prefix:
+            # nginx sends the bytes (sendfile, ranges, gzip_static); we only route and label them
+            relative = path.relative_to(self.root).as_posix()
+            headers["X-Accel-Redirect"] = f"{self.accel_redirect_prefix.rstrip('/')}/{relative}"
+            return Response(media_type=media_type, headers=headers)
+
+        encoding = None
+        accepted = request.headers.get("accept-encoding", "")
+        for name, suffix in PRECOMPRESSED:
+            if name in accepted and path.with_name(path.name + suffix).is_file():
+                encoding, path = name, path.with_name(path.name + suffix)
+                headers["Content-Encoding"] = name
+                break
+
+        etag = f'"{path.name}"'
+        headers["ETag"] = etag
+        if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+            return Response(status_code=304, headers=headers)
+
+        size = os.stat(path).st_size
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        # ranges of an encoded body would be ranges of the compressed bytes; keep it simple
+        if range_header and encoding is None and (if_range is None or if_range == etag):
+            byte_range = _parse_range(range_header, size)
+            if byte_range is not None:
+                start, end = byte_range
+                if start >= size or start > end:
+                    return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                headers["Content-Length"] = str(end - start + 1)
+                if request.method == "HEAD":
+                    return Response(status_code=206, media_type=media_type, headers=headers)
+                return StreamingResponse(
+                    _read_range(path, start, end), status_code=206, media_type=media_type, headers=headers
+                )
+
+        return FileResponse(path, media_type=media_type, headers=headers, stat_result=os.stat(path))
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Any
+
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:  # only needed for STORAGE_BACKEND=s3
+    boto3 = None
+    ClientError = Exception  # type: ignore[assignment,misc]
+
+from app.core.config import settings
+
+# stored objects are named by content hash, so they never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+# Where uploaded bytes live. Keys are relative, "/"-separated paths. Methods
+# block, so routes call them through the threadpool; the image pipeline calls
+# them from its own executor.
+class StorageBackend(ABC):
+    @abstractmethod
+    def url(self, key: str) -> str: ...
+
+    @abstractmethod
+    def size(self, key: str) -> int | None: ...
+
+    # moves `src` into storage; a no-op when the key already exists
+    @abstractmethod
+    def save(self, src: Path, key: str, content_type: str) -> None: ...
+
+    # a local file with the object's bytes, valid inside the block
+    @abstractmethod
+    def open_local(self, key: str) -> AbstractContextManager[Path]: ...
+
+    # None when the backend can't take uploads directly from the browser
+    def presign_upload(self, key: str, content_type: str, size: int, sha256_b64: str) -> dict[str, Any] | None:
+        return None
+
+    # whether a direct upload landed with the announced size and checksum
+    def verify_upload(self, key: str, size: int, sha256_b64: str) -> bool:
+        return self.size(key) == size
+
+
+# Files under `root`, served by the API itself (see main.py).
+class LocalStorage(StorageBackend):
+    def __init__(self, root: Path, url_prefix: str) -> None:
+        self.root = root
+        self.url_prefix = url_prefix
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def size(self, key: str) -> int | None:
+        try:
+            return self.path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def save(self, src: Path, key: str, content_type: str) -> None:
+        dst = self.path(key)
+        if dst.exists():
+            # same bytes are already stored; drop the duplicate
+            src.unlink(missing_ok=True)
+            return
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(src, dst)
+        except OSError:
+            # different filesystem: copy next to the target, then rename atomically;
+            # the dot keeps the half-copied file from being served
+            partial = dst.with_name(f".{dst.name}.partial")
+            shutil.copyfile(src, partial)
+            os.replace(partial, dst)
+            src.unlink(missing_ok=True)
+
+    @contextmanager
+    def open_local(self, key: str) -> Iterator[Path]:
+        yield self.path(key)
+
+
+# Any S3-compatible service (AWS, MinIO, R2...). Clients load files straight
+# from `public_url` and can upload with presigned PUTs, so no bytes pass
+# through the API for direct uploads.
+class S3Storage(StorageBackend):
+    def __init__(
+        self,
+        bucket: str,
+        public_url: str,
+        endpoint_url: str | None = None,
+        region: str | None = None,
+        access_key_id: str | None = None,
+        secret_access_key: str | None = None,
+        presign_seconds: int = 900,
+    ) -> None:
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/")
+        self.presign_seconds = presign_seconds
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            # SigV4 signs the content type, length and checksum into presigned URLs
+            config=Config(signature_version="s3v4"),
+        )
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def _head(self, key: str) -> dict[str, Any] | None:
+        try:
+            return self._client.head_object(Bucket=self.bucket, Key=key, ChecksumMode="ENABLED")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in {"404", "NoSuchKey", "NotFound"}:
+                return None
+            raise
+
+    def size(self, key: str) -> int | None:
+        head = self._head(key)
+        return head["ContentLength"] if head is not None else None
+
+    def save(self, src: Path, key: str, content_type: str) -> None:
+        if self._head(key) is None:
+            self._client.upload_file(
+                str(src),
+                self.bucket,
+                key,
+                ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE_CACHE_CONTROL},
+            )
+        src.unlink(missing_ok=True)
+
+    @contextmanager
+    def open_local(self, key: str) -> Iterator[Path]:
+        fd, name = tempfile.mkstemp(prefix="asset-")
+        os.close(fd)
+        path = Path(name)
+        try:
+            self._client.download_file(self.bucket, key, name)
+            yield path
+        finally:
+            path.unlink(missing_ok=True)
+
+    def presign_upload(self, key: str, content_type: str, size: int, sha256_b64: str) -> dict[str, Any] | None:
+        # length, type and checksum are signed: the store rejects any other body
+        url = self._client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ContentType": content_type,
+                "ContentLength": size,
+                "ChecksumSHA256": sha256_b64,
+                "CacheControl": IMMUTABLE_CACHE_CONTROL,
+            },
+            ExpiresIn=self.presign_seconds,
+        )
+        headers = {
+            "Content-Type": content_type,
+            "x-amz-checksum-sha256": sha256_b64,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        }
+        return {"method": "PUT", "url": url, "headers": headers}
+
+    def verify_upload(self, key: str, size: int, sha256_b64: str) -> bool:
+        head = self._head(key)
+        if head is None or head["ContentLength"] != size:
+            return False
+        # stores without checksum support don't echo it back; size is all we can check
+        checksum = head.get("ChecksumSHA256")
+        return checksum is None or checksum == sha256_b64
+
+
+def create_storage(name: str) -> StorageBackend:
+    if name == "local":
+        return LocalStorage(Path("storage/uploads"), "/storage/uploads")
+    if name == "s3":
+        if not settings.S3_BUCKET or not settings.S3_PUBLIC_URL:
+            raise ValueError("STORAGE_BACKEND=s3 needs S3_BUCKET and S3_PUBLIC_URL")
+        return S3Storage(
+            settings.S3_BUCKET,
+            settings.S3_PUBLIC_URL,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            presign_seconds=settings.UPLOAD_PRESIGN_SECONDS,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {name}")
+
+
+storage = create_storage(settings.STORAGE_BACKEND)
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import hashlib
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+ALLOWED_MIME = {"image/png", "image/jpeg", "image/webp"}
+
+# file bytes are handed to the writer thread in batches of this size
+CHUNK_SIZE = 1024 * 1024
+# enough to tell the allowed formats apart
+SNIFF_BYTES = 12
+# text fields (type, name) are tiny; anything bigger is not a legitimate form
+FIELD_MAX_BYTES = 4096
+# the form has two text fields; a few spare for clients that send extras
+FIELDS_MAX = 8
+# multipart boundaries and part headers on top of the file itself
+FORM_OVERHEAD_BYTES = 16 * 1024
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+# Sink on a worker thread: hashes and writes each batch in one hop.
+class _HashingWriter:
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = path.open("wb")
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes) -> None:
+        self.digest.update(data)
+        self._file.write(data)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ReceivedUpload:
+    __slots__ = ("fields", "content_type", "digest", "size")
+
+    def __init__(self, fields: dict[str, str], content_type: str, digest: str, size: int) -> None:
+        self.fields = fields
+        self.content_type = content_type
+        self.digest = digest
+        self.size = size
+
+
+# Incremental multipart/form-data parser. Text fields are collected; bytes of
+# the `file` part are buffered in `file_data` for the caller to drain.
+class _FormStream:
+    def __init__(self, boundary: bytes) -> None:
+        self.fields: dict[str, str] = {}
+        self.file_data = bytearray()
+        self.file_seen = False
+        self.file_done = False
+        self._name = ""
+        self._in_file = False
+        self._parts = 0
+        self._field = bytearray()
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._headers: dict[bytes, bytes] = {}
+        self._parser = MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+            },
+        )
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.write(chunk)
+
+    def finish(self) -> None:
+        self._parser.finalize()
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+        self._field.clear()
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def _on_headers_finished(self) -> None:
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = params.get(b"name", b"").decode("utf-8", "replace")
+        self._in_file = self._name == "file"
+        if self._in_file:
+            if self.file_seen:
+                raise HTTPException(status_code=422, detail="Only one file per upload")
+            self.file_seen = True
+        else:
+            self._parts += 1
+            if self._parts > FIELDS_MAX:
+                raise HTTPException(status_code=413, detail="Too many form fields")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self.file_data += data[start:end]
+            return
+        self._field += data[start:end]
+        if len(self._field) > FIELD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Field too large: {self._name}")
+
+    def _on_part_end(self) -> None:
+        if self._in_file:
+            self.file_done = True
+        elif self._name:
+            self.fields[self._name] = self._field.decode("utf-8", "replace")
+
+
+# Streams a multipart upload from the socket into `dst`, hashing as it goes.
+# The body is never spooled: oversized requests are refused from
+# Content-Length or as soon as the limit is crossed, and the format is
+# sniffed from the first bytes of the file. `dst` is removed on any failure.
+# `check_fields` sees the text fields sent before the file, so a bad form is
+# refused before its file is read.
+async def receive_upload(
+    request: Request,
+    dst: Path,
+    max_bytes: int,
+    check_fields: Callable[[dict[str, str]], None] | None = None,
+) -> ReceivedUpload:
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+
+    # the whole body, so fields can't stream forever when there is no Content-Length
+    body_max = max_bytes + FORM_OVERHEAD_BYTES
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > body_max:
+        raise HTTPException(status_code=413, detail=f"File too large (max {max_bytes} bytes)")
+
+    form = _FormStream(boundary)
+    writer: _HashingWriter | None = None
+    sniffed: str | None = None
+    received = 0
+    body_bytes = 0
+
+    async def drain(final: bool) -> None:
+        nonlocal writer, sniffed, received
+        if writer is None:
+            if not form.file_data or (len(form.file_data) < SNIFF_BYTES and not (final or form.file_done)):
+                return
+            if check_fields is not None:
+                check_fields(form.fields)
+            sniffed = sniff_image_type(bytes(form.file_data[:SNIFF_BYTES]))
+            if sniffed not in ALLOWED_MIME:
+                raise HTTPException(status_code=415, detail="Unsupported file format. Allowed: png, jpeg, webp.")
+            writer = await asyncio.to_thread(_HashingWriter, dst)
+        # batch small socket reads into fewer thread hops
+        if len(form.file_data) < CHUNK_SIZE and not (final or form.file_done):
+            return
+        data = bytes(form.file_data)
+        form.file_data.clear()
+        received += len(data)
+        if data:
+            await asyncio.to_thread(writer.write, data)
+
+    try:
+        async for chunk in request.stream():
+            body_bytes += len(chunk)
+            if body_bytes > body_max:
+                raise HTTPException(status_code=413, detail=f"File too large (max {max_bytes} bytes)")
+            form.feed(chunk)
+            if received + len(form.file_data) > max_bytes:
+                raise HTTPException(status_code=413, detail=f"File too large (max {max_bytes} bytes)")
+            await drain(final=False)
+        form.finish()
+        await drain(final=True)
+        if writer is None or sniffed is None or received == 0:
+            raise HTTPException(status_code=422, detail="File is required")
+        await asyncio.to_thread(writer.close)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        dst.unlink(missing_ok=True)
+        raise
+
+    return ReceivedUpload(form.fields, sniffed, writer.digest.hexdigest(), received)
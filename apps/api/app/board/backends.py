@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import asyncio
+from collections.abc import Callable
+import json
+import logging
+import threading
+import time
+from typing import Any
+import uuid
+
+import psycopg2
+from sqlalchemy.engine import make_url
+
+log = logging.getLogger(__name__)
+
+# (key, message) -> None; always invoked on the event loop thread
+Handler = Callable[[str, dict[str, Any]], None]
+
+
+# Transport that delivers events to every worker, including the sender. Events
+# are grouped by topic ("board" for room events, others for cache invalidation).
+# Rooms never apply their own writes directly: they publish, and apply what the
+# backend delivers. As long as every worker sees events in the same order, all
+# workers converge on the same state and revision.
+class BoardBackend(ABC):
+    # True when other processes may hold copies of the same rooms
+    shared = False
+
+    def __init__(self) -> None:
+        self.worker_id = uuid.uuid4().hex
+        self._handlers: dict[str, Handler] = {}
+        self._resets: list[Callable[[], None]] = []
+        self._running = False
+
+    # on_reset is called when events may have been missed (e.g. after a reconnect)
+    def subscribe(self, topic: str, handler: Handler, on_reset: Callable[[], None] | None = None) -> None:
+        self._handlers[topic] = handler
+        if on_reset is not None:
+            self._resets.append(on_reset)
+
+    async def start(self) -> None:
+        self._running = True
+
+    async def stop(self) -> None:
+        self._running = False
+
+    @abstractmethod
+    async def publish(self, topic: str, key: str, message: dict[str, Any]) -> None: ...
+
+    def _deliver(self, topic: str, key: str, message: dict[str, Any]) -> None:
+        handler = self._handlers.get(topic) if self._running else None
+        if handler is None:
+            return
+        try:
+            handler(key, message)
+        except Exception:
+            log.exception("Event handler failed for %s/%s.", topic, key)
+
+    def _reset(self) -> None:
+        for on_reset in self._resets:
+            try:
+                on_reset()
+            except Exception:
+                log.exception("Event reset handler failed.")
+
+
+class InProcessBackend(BoardBackend):
+    async def publish(self, topic: str, key: str, message: dict[str, Any]) -> None:
+        self._deliver(topic, key, {**message, "worker": self.worker_id})
+
+
+# LISTEN/NOTIFY on the application database. Postgres delivers notifications
+# in commit order to every listener, which gives all workers the same event
+# order. Payloads above the NOTIFY limit are split into chunks and reassembled
+# on the listening side.
+class PostgresBackend(BoardBackend):
+    shared = True
+
+    CHANNEL = "board_events"
+    # NOTIFY payloads must stay below 8000 bytes
+    MAX_PAYLOAD = 7500
+    CHUNK_TTL_SECONDS = 30.0
+    RECONNECT_MAX_SECONDS = 5.0
+
+    def __init__(self, database_url: str) -> None:
+        super().__init__()
+        url = make_url(database_url).set(drivername="postgresql")
+        self._dsn = url.render_as_string(hide_password=False)
+        self._listen_conn: Any = None
+        self._notify_conn: Any = None
+        self._notify_lock = threading.Lock()
+        self._chunks: dict[str, tuple[float, list[str | None]]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._reconnect_task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        await super().start()
+        self._loop = asyncio.get_running_loop()
+        await self._listen()
+
+    async def stop(self) -> None:
+        await super().stop()
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self._close_listen()
+        with self._notify_lock:
+            if self._notify_conn is not None:
+                self._notify_conn.close()
+                self._notify_conn = None
+
+    async def publish(self, topic: str, key: str, message: dict[str, Any]) -> None:
+        envelope = {**message, "topic": topic, "key": key, "worker": self.worker_id}
+        body = json.dumps(envelope, separators=(",", ":"))
+        if len(body.encode("utf-8")) <= self.MAX_PAYLOAD:
+            payloads = [body]
+        else:
+            payloads = self._split(body)
+        await asyncio.to_thread(self._notify, payloads)
+
+    def _split(self, body: str) -> list[str]:
+        chunk_id = uuid.uuid4().hex
+        # leave room for the chunk envelope; chars may be multi-byte
+        size = self.MAX_PAYLOAD // 4
+        parts = [body[i : i + size] for i in range(0, len(body), size)]
+        return [
+            json.dumps({"chunk": chunk_id, "i": i, "n": len(parts), "data": part}, separators=(",", ":"))
+            for i, part in enumerate(parts)
+        ]
+
+    def _notify(self, payloads: list[str]) -> None:
+        with self._notify_lock:
+            for attempt in (1, 2):
+                try:
+                    if self._notify_conn is None or self._notify_conn.closed:
+                        self._notify_conn = psycopg2.connect(self._dsn)
+                        self._notify_conn.autocommit = True
+                    with self._notify_conn.cursor() as cur:
+                        # one transaction so chunks of a payload stay contiguous
+                        cur.execute("BEGIN")
+                        for payload in payloads:
+                            cur.execute("SELECT pg_notify(%s, %s)", (self.CHANNEL, payload))
+                        cur.execute("COMMIT")
+                    return
+                except psycopg2.OperationalError:
+                    self._notify_conn = None
+                    if attempt == 2:
+                        raise
+
+    async def _listen(self) -> None:
+        conn = await asyncio.to_thread(psycopg2.connect, self._dsn)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.CHANNEL}")
+        self._listen_conn = conn
+        assert self._loop is not None
+        self._loop.add_reader(conn.fileno(), self._on_readable)
+
+    def _close_listen(self) -> None:
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is None:
+            return
+        if self._loop is not None:
+            try:
+                self._loop.remove_reader(conn.fileno())
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _on_readable(self) -> None:
+        conn = self._listen_conn
+        if conn is None:
+            return
+        try:
+            conn.poll()
+        except Exception:
+            log.warning("Board LISTEN connection lost, reconnecting.")
+            self._close_listen()
+            if self._running and self._reconnect_task is None:
+                assert self._loop is not None
+                self._reconnect_task = self._loop.create_task(self._reconnect())
+            return
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            self._on_payload(notify.payload)
+
+    def _on_payload(self, raw: str) -> None:
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        if "chunk" in message:
+            message = self._reassemble(message)
+            if message is None:
+                return
+        topic = message.pop("topic", None)
+        key = message.pop("key", None)
+        if isinstance(topic, str) and isinstance(key, str):
+            self._deliver(topic, key, message)
+
+    def _reassemble(self, part: dict[str, Any]) -> dict[str, Any] | None:
+        now = time.monotonic()
+        for chunk_id in [k for k, (ts, _) in self._chunks.items() if now - ts > self.CHUNK_TTL_SECONDS]:
+            del self._chunks[chunk_id]
+
+        chunk_id, index, total = part["chunk"], part["i"], part["n"]
+        _, parts = self._chunks.setdefault(chunk_id, (now, [None] * total))
+        parts[index] = part["data"]
+        if any(p is None for p in parts):
+            return None
+        del self._chunks[chunk_id]
+        try:
+            return json.loads("".join(parts))  # type: ignore[arg-type]
+        except ValueError:
+            return None
+
+    async def _reconnect(self) -> None:
+        delay = 0.1
+        try:
+            while self._running:
+                try:
+                    await self._listen()
+                    break
+                except Exception:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+            # events published while we were disconnected are gone
+            if self._running:
+                self._reset()
+        finally:
+            self._reconnect_task = None
+
+
+def create_backend(name: str, database_url: str) -> BoardBackend:
+    # new transports (e.g. redis) plug in here
+    if name == "memory":
+        return InProcessBackend()
+    if name == "postgres":
+        return PostgresBackend(database_url)
+    raise ValueError(f"Unknown BOARD_BACKEND: {name}")
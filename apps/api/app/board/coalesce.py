@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any
+
+from app.board.connection import Frame
+from app.board.state import OP_ADD, OP_MOVE, OP_REMOVE, OP_SELECT_MAP, OP_SET_VIEW, OP_UPDATE
+
+AVATAR_OPS = (OP_ADD, OP_REMOVE, OP_MOVE, OP_UPDATE)
+
+
+# Applied ops waiting for the room's next tick, merged last-writer-wins: a
+# drag that produced fifty moves goes out as one, and an update only keeps
+# the fields nobody overwrote later. Ops are already validated and applied,
+# so any surviving order is a valid one; superseded entries are dropped and
+# the newer one goes to the end.
+class PatchBuffer:
+    def __init__(self) -> None:
+        self.base_rev: int | None = None
+        self.rev = 0
+        # key -> (origin, op); insertion order is broadcast order
+        self._ops: OrderedDict[tuple[str, ...], tuple[str, dict[str, Any]]] = OrderedDict()
+
+    def __bool__(self) -> bool:
+        return bool(self._ops)
+
+    def add(self, base_rev: int, rev: int, origin: str, ops: list[dict[str, Any]]) -> None:
+        if self.base_rev is None:
+            self.base_rev = base_rev
+        self.rev = rev
+        for op in ops:
+            self._add(origin, op)
+
+    def _add(self, origin: str, op: dict[str, Any]) -> None:
+        kind = op["op"]
+        if kind == OP_ADD or kind == OP_REMOVE:
+            # replaces or ends the avatar: nothing pending for it still matters
+            avatar_id = op["avatar"]["id"] if kind == OP_ADD else op["id"]
+            if kind == OP_ADD and (OP_ADD, avatar_id) in self._ops:
+                # adding an existing avatar replaces it where it is, so the new
+                # add takes the pending one's place (after its remove, if any)
+                self._drop_avatar(avatar_id, keep=(OP_REMOVE, OP_ADD))
+                self._ops[(kind, avatar_id)] = (origin, op)
+                return
+            removed = self._ops.get((OP_REMOVE, avatar_id)) if kind == OP_ADD else None
+            self._drop_avatar(avatar_id)
+            if removed is not None:
+                # re-adding after a remove puts the avatar last; keep the remove
+                # so replicas reorder the same way
+                self._ops[(OP_REMOVE, avatar_id)] = removed
+            self._ops[(kind, avatar_id)] = (origin, op)
+        elif kind == OP_MOVE:
+            key = (kind, op["id"])
+            self._strip_updates(op["id"], ("x", "y"))
+            self._ops.pop(key, None)
+            self._ops[key] = (origin, op)
+        elif kind == OP_UPDATE:
+            self._add_update(origin, op)
+        elif kind == OP_SELECT_MAP:
+            self._ops.pop((kind,), None)
+            self._ops[(kind,)] = (origin, op)
+        elif kind == OP_SET_VIEW:
+            key = (kind, op["mapId"])
+            self._ops.pop(key, None)
+            self._ops[key] = (origin, op)
+
+    def _add_update(self, origin: str, op: dict[str, Any]) -> None:
+        avatar_id = op["id"]
+        fields = op["fields"]
+        pending = self._ops.pop((OP_UPDATE, avatar_id, origin), None)
+        if pending is not None:
+            # the same writer: one update with the newest value per field. Any
+            # field set by an op in between was already stripped from it, so
+            # moving the rest to the end can't reorder them past that op.
+            fields = {**pending[1]["fields"], **fields}
+        self._strip_updates(avatar_id, fields)
+        self._ops[(OP_UPDATE, avatar_id, origin)] = (origin, {**op, "fields": fields})
+
+    # a newer op sets `fields` on the avatar; pending updates lose them
+    def _strip_updates(self, avatar_id: str, fields: Iterable[str]) -> None:
+        fields = set(fields)
+        for key in [key for key in self._ops if key[0] == OP_UPDATE and key[1] == avatar_id]:
+            other_origin, other = self._ops[key]
+            remaining = {name: value for name, value in other["fields"].items() if name not in fields}
+            if remaining:
+                self._ops[key] = (other_origin, {**other, "fields": remaining})
+            else:
+                del self._ops[key]
+
+    def _drop_avatar(self, avatar_id: str, keep: tuple[str, ...] = ()) -> None:
+        for key in [key for key in self._ops if key[0] in AVATAR_OPS and key[0] not in keep and key[1] == avatar_id]:
+            del self._ops[key]
+
+    def frame(self) -> Frame:
+        assert self.base_rev is not None
+        origins = {origin for origin, _ in self._ops.values()}
+        message: dict[str, Any] = {"type": "patch", "baseRev": self.base_rev, "rev": self.rev}
+        if len(origins) == 1:
+            message["origin"] = origins.pop()
+            message["ops"] = [op for _, op in self._ops.values()]
+        else:
+            # several writers in one tick: each op says whose it is
+            message["ops"] = [{**op, "origin": origin} for origin, op in self._ops.values()]
+        return Frame(self.rev, message)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import msgpack
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# WebSocket subprotocols a client may offer, most compact first
+SUBPROTOCOLS = {"board.msgpack": MSGPACK, "board.json": JSON}
+
+
+def negotiate(offered: list[str], query_encoding: str | None) -> tuple[str, str | None]:
+    # returns (encoding, subprotocol to accept); the first offer we know wins,
+    # then ?encoding=, then JSON
+    for protocol in offered:
+        encoding = SUBPROTOCOLS.get(protocol)
+        if encoding is not None:
+            return encoding, protocol
+    if query_encoding in (JSON, MSGPACK):
+        return query_encoding, None
+    return JSON, None
+
+
+def encode(message: dict[str, Any], encoding: str) -> str | bytes:
+    if encoding == MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message, separators=(",", ":"))
+
+
+# Text frames are JSON and binary frames MessagePack, whatever was
+# negotiated. Any malformed input raises ValueError.
+def decode(data: str | bytes) -> Any:
+    if isinstance(data, bytes):
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            # the unpacker also raises TypeError (unhashable keys) and its own types
+            raise ValueError(str(e)) from e
+    return json.loads(data)
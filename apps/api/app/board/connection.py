@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Callable
+import logging
+import time
+from typing import Any
+
+from fastapi import WebSocket
+
+from app.board.codec import encode
+from app.core import metrics
+
+log = logging.getLogger(__name__)
+
+# close code for consumers that can't keep up ("try again later")
+CLOSE_SLOW_CONSUMER = 1013
+# the access token expired: reconnect with a fresh one
+CLOSE_SESSION_EXPIRED = 4001
+# the user was deactivated or removed: don't reconnect
+CLOSE_SESSION_REVOKED = 4003
+
+
+# An outbound message shared by every connection it is sent to. Each encoding
+# is serialized at most once, by the first writer that needs it.
+async def send_encoded(websocket: WebSocket, data: str | bytes) -> None:
+    if isinstance(data, bytes):
+        await websocket.send_bytes(data)
+    else:
+        await websocket.send_text(data)
+
+
+class Frame:
+    __slots__ = ("rev", "message", "is_snapshot", "_encoded")
+
+    def __init__(self, rev: int, message: dict[str, Any], is_snapshot: bool = False) -> None:
+        self.rev = rev
+        self.message = message
+        self.is_snapshot = is_snapshot
+        self._encoded: dict[str, str | bytes] = {}
+
+    def encoded(self, encoding: str) -> str | bytes:
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = encode(self.message, encoding)
+        return data
+
+
+# One subscribed socket with its own outbound queue and writer task. Producers
+# never await the socket: they enqueue pre-serialized frames and the writer
+# drains them, so a slow client only delays itself.
+class BoardConnection:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        client_id: str,
+        encoding: str,
+        snapshot: Callable[[], Frame],
+        max_queue: int,
+        max_lag_seconds: float,
+        user_id: str = "",
+        expires_at: float | None = None,
+    ) -> None:
+        self.websocket = websocket
+        self.client_id = client_id
+        self.encoding = encoding
+        self.user_id = user_id
+        # unix time the socket's access token expires at
+        self.expires_at = expires_at
+        self._snapshot = snapshot
+        self._max_queue = max_queue
+        self._max_lag = max_lag_seconds
+        self._queue: deque[tuple[float, Frame]] = deque()
+        self._wakeup = asyncio.Event()
+        self._needs_snapshot = False
+        self._closed = False
+        self._close_code = CLOSE_SLOW_CONSUMER
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._writer())
+
+    async def stop(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def close(self, code: int) -> None:
+        # the writer sends the close frame; the receive loop then sees the disconnect
+        if self._closed:
+            return
+        self._close_code = code
+        self._closed = True
+        self._wakeup.set()
+
+    def send(self, frame: Frame) -> None:
+        if self._closed:
+            return
+        now = time.monotonic()
+        if self._queue and now - self._queue[0][0] > self._max_lag:
+            log.info("Board client %s lagging by more than %.1fs, disconnecting.", self.client_id, self._max_lag)
+            self._closed = True
+            self._wakeup.set()
+            return
+
+        if frame.is_snapshot:
+            # a snapshot supersedes everything older that is still queued
+            self._drop_through(frame.rev)
+        elif len(self._queue) >= self._max_queue:
+            # too far behind to replay patches: collapse to one fresh snapshot
+            self._queue.clear()
+            self._needs_snapshot = True
+            self._wakeup.set()
+            return
+
+        self._queue.append((now, frame))
+        self._wakeup.set()
+
+    def request_snapshot(self) -> None:
+        self._needs_snapshot = True
+        self._wakeup.set()
+
+    def _drop_through(self, rev: int) -> None:
+        self._queue = deque(item for item in self._queue if item[1].rev > rev)
+
+    async def _writer(self) -> None:
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while not self._closed:
+                    if self._needs_snapshot:
+                        self._needs_snapshot = False
+                        frame = self._snapshot()
+                        self._drop_through(frame.rev)
+                    elif self._queue:
+                        queued_at, frame = self._queue.popleft()
+                        metrics.board_send_lag_seconds.observe(time.monotonic() - queued_at)
+                    else:
+                        break
+                    data = frame.encoded(self.encoding)
+                    await asyncio.wait_for(send_encoded(self.websocket, data), timeout=self._max_lag)
+                if self._closed:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            log.info("Board client %s send timed out, disconnecting.", self.client_id)
+        except Exception:
+            pass
+        self._closed = True
+        self._queue.clear()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=self._close_code), timeout=1)
+        except Exception:
+            pass
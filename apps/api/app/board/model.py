@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import math
+from typing import Any
+
+# Bounds for client-supplied values. Out-of-range numbers are clamped, bad
+# types and oversized strings reject the whole avatar, view or op.
+ID_MAX_LEN = 64
+NAME_MAX_LEN = 120
+URL_MAX_LEN = 2048
+COORD_MAX = 100_000.0  # board pixels
+SIZE_MAX = 20  # grid cells
+HP_MAX = 1_000_000
+VIEW_SCALE_MIN = 10.0  # percent of the board width
+VIEW_SCALE_MAX = 1000.0
+VIEW_OFFSET_MAX = 100.0  # background position, percent
+MAX_MAP_VIEWS = 500
+
+
+def _string(value: Any, max_len: int, allow_empty: bool = False) -> str | None:
+    if not isinstance(value, str) or len(value) > max_len or (not value and not allow_empty):
+        return None
+    return value
+
+
+def _number(value: Any, low: float, high: float) -> float | None:
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+        return None
+    return min(max(value, low), high)
+
+
+def _integer(value: Any, low: int, high: int) -> int | None:
+    number = _number(value, low, high)
+    return None if number is None else int(number)
+
+
+def valid_id(value: Any) -> str | None:
+    return _string(value, ID_MAX_LEN)
+
+
+class PlacedAvatar:
+    __slots__ = ("id", "asset_id", "name", "file_url", "x", "y", "size", "hp_total", "hp_current")
+
+    # wire name -> (slot, parser); `id` is fixed once placed
+    FIELDS: dict[str, tuple[str, Any]] = {
+        "assetId": ("asset_id", lambda v: _string(v, ID_MAX_LEN, allow_empty=True)),
+        "name": ("name", lambda v: _string(v, NAME_MAX_LEN, allow_empty=True)),
+        "fileUrl": ("file_url", lambda v: _string(v, URL_MAX_LEN, allow_empty=True)),
+        "x": ("x", lambda v: _number(v, 0.0, COORD_MAX)),
+        "y": ("y", lambda v: _number(v, 0.0, COORD_MAX)),
+        "size": ("size", lambda v: _integer(v, 1, SIZE_MAX)),
+        "hpTotal": ("hp_total", lambda v: _integer(v, 0, HP_MAX)),
+        "hpCurrent": ("hp_current", lambda v: _integer(v, 0, HP_MAX)),
+    }
+
+    def __init__(self, avatar_id: str) -> None:
+        self.id = avatar_id
+        self.asset_id = ""
+        self.name = ""
+        self.file_url = ""
+        self.x = 0.0
+        self.y = 0.0
+        # same defaults as the web client
+        self.size = 1
+        self.hp_total = 10
+        self.hp_current = 10
+
+    @classmethod
+    def from_json(cls, data: Any) -> PlacedAvatar | None:
+        if not isinstance(data, dict):
+            return None
+        avatar_id = valid_id(data.get("id"))
+        parsed = cls._parse(data)
+        if avatar_id is None or parsed is None:
+            return None
+        avatar = cls(avatar_id)
+        if "hpTotal" in parsed and "hpCurrent" not in parsed:
+            parsed["hpCurrent"] = parsed["hpTotal"]
+        avatar._set(parsed)
+        return avatar
+
+    # known fields of `data`, normalized; None when any of them is invalid.
+    # Unknown fields are dropped.
+    @classmethod
+    def _parse(cls, data: dict[str, Any]) -> dict[str, Any] | None:
+        parsed: dict[str, Any] = {}
+        for key, value in data.items():
+            field = cls.FIELDS.get(key)
+            if field is None:
+                continue
+            clean = field[1](value)
+            if clean is None:
+                return None
+            parsed[key] = clean
+        return parsed
+
+    def _set(self, parsed: dict[str, Any]) -> None:
+        for key, value in parsed.items():
+            setattr(self, self.FIELDS[key][0], value)
+        if self.hp_current > self.hp_total:
+            self.hp_current = self.hp_total
+            if "hpCurrent" in parsed or "hpTotal" in parsed:
+                parsed["hpCurrent"] = self.hp_current
+
+    # returns the applied fields, or None (and no change) when there is
+    # nothing valid to apply
+    def update(self, data: dict[str, Any]) -> dict[str, Any] | None:
+        parsed = self._parse(data)
+        if not parsed:
+            return None
+        self._set(parsed)
+        return parsed
+
+    def move(self, x: Any, y: Any) -> tuple[float, float] | None:
+        clean_x, clean_y = _number(x, 0.0, COORD_MAX), _number(y, 0.0, COORD_MAX)
+        if clean_x is None or clean_y is None:
+            return None
+        self.x, self.y = clean_x, clean_y
+        return clean_x, clean_y
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "assetId": self.asset_id,
+            "name": self.name,
+            "fileUrl": self.file_url,
+            "x": self.x,
+            "y": self.y,
+            "size": self.size,
+            "hpTotal": self.hp_total,
+            "hpCurrent": self.hp_current,
+        }
+
+
+class MapView:
+    __slots__ = ("scale", "x", "y")
+
+    def __init__(self, scale: float, x: float, y: float) -> None:
+        self.scale = scale
+        self.x = x
+        self.y = y
+
+    @classmethod
+    def from_json(cls, data: Any) -> MapView | None:
+        if not isinstance(data, dict):
+            return None
+        scale = _number(data.get("scale"), VIEW_SCALE_MIN, VIEW_SCALE_MAX)
+        x = _number(data.get("x"), 0.0, VIEW_OFFSET_MAX)
+        y = _number(data.get("y"), 0.0, VIEW_OFFSET_MAX)
+        if scale is None or x is None or y is None:
+            return None
+        return cls(scale, x, y)
+
+    def to_json(self) -> dict[str, Any]:
+        return {"scale": self.scale, "x": self.x, "y": self.y}
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import logging
+from typing import Any
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.models.board import Board, BoardOp
+
+log = logging.getLogger(__name__)
+
+EMPTY_STATE: dict[str, Any] = {"selectedMapId": "", "placedAvatars": [], "mapViews": {}}
+
+
+# Write-behind log of board revisions. Rooms record ops in memory; a background
+# task flushes them in batches and periodically compacts a room into a snapshot
+# so rehydration only replays a short tail.
+class BoardPersister:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        flush_interval_seconds: float,
+        flush_max_ops: int,
+        snapshot_every: int,
+    ) -> None:
+        self._session_factory = session_factory
+        self._flush_interval = flush_interval_seconds
+        self._flush_max_ops = flush_max_ops
+        self._snapshot_every = snapshot_every
+        # a failing database must not grow the buffer without bound
+        self._max_buffered = flush_max_ops * 10
+
+        self._ops: list[tuple[str, int, list[Any]]] = []
+        self._snapshots: dict[str, tuple[int, dict[str, Any]]] = {}
+        self._since_snapshot: dict[str, int] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._lock: asyncio.Lock | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def record(self, room_id: str, rev: int, ops: list[Any], snapshot: Callable[[], dict[str, Any]]) -> None:
+        self._ops.append((room_id, rev, ops))
+        count = self._since_snapshot.get(room_id, 0) + 1
+        if count >= self._snapshot_every:
+            self.record_snapshot(room_id, rev, snapshot())
+        else:
+            self._since_snapshot[room_id] = count
+        if len(self._ops) >= self._flush_max_ops and self._wakeup is not None:
+            self._wakeup.set()
+
+    def record_snapshot(self, room_id: str, rev: int, state: dict[str, Any]) -> None:
+        self._snapshots[room_id] = (rev, state)
+        self._since_snapshot[room_id] = 0
+
+    async def load(self, room_id: str) -> tuple[int, dict[str, Any], list[tuple[int, list[Any]]]]:
+        return await asyncio.to_thread(self._load, room_id)
+
+    def _load(self, room_id: str) -> tuple[int, dict[str, Any], list[tuple[int, list[Any]]]]:
+        db = self._session_factory()
+        try:
+            board = db.get(Board, room_id)
+            rev = board.rev if board else 0
+            state = board.state if board else EMPTY_STATE
+            rows = (
+                db.query(BoardOp.rev, BoardOp.ops)
+                .filter(BoardOp.board_id == room_id, BoardOp.rev > rev)
+                .order_by(BoardOp.rev)
+                .all()
+            )
+        finally:
+            db.close()
+
+        tail: list[tuple[int, list[Any]]] = []
+        expected = rev + 1
+        for row_rev, ops in rows:
+            if row_rev != expected:
+                # a lost batch leaves a hole; stop at the last contiguous revision
+                break
+            tail.append((row_rev, ops))
+            expected += 1
+        return rev, state, tail
+
+    async def flush(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            ops, self._ops = self._ops, []
+            snapshots, self._snapshots = self._snapshots, {}
+            if not ops and not snapshots:
+                return
+            try:
+                await asyncio.to_thread(self._write, ops, snapshots)
+            except Exception:
+                log.exception("Board flush failed; keeping %d op batch(es) for retry.", len(ops))
+                self._ops = (ops + self._ops)[-self._max_buffered :]
+                for room_id, snap in snapshots.items():
+                    current = self._snapshots.get(room_id)
+                    if current is None or current[0] < snap[0]:
+                        self._snapshots[room_id] = snap
+
+    def _write(self, ops: list[tuple[str, int, list[Any]]], snapshots: dict[str, tuple[int, dict[str, Any]]]) -> None:
+        db = self._session_factory()
+        try:
+            room_ids = {room_id for room_id, _, _ in ops} | set(snapshots)
+            existing = {row.id for row in db.query(Board.id).filter(Board.id.in_(room_ids))}
+            for room_id in room_ids - existing:
+                db.add(Board(id=room_id, rev=0, state=EMPTY_STATE))
+            db.flush()
+
+            rows = [{"board_id": room_id, "rev": rev, "ops": room_ops} for room_id, rev, room_ops in ops]
+            if rows:
+                try:
+                    with db.begin_nested():
+                        db.execute(BoardOp.__table__.insert(), rows)
+                except IntegrityError:
+                    # another worker already wrote some of these revisions
+                    for row in rows:
+                        try:
+                            with db.begin_nested():
+                                db.execute(BoardOp.__table__.insert(), [row])
+                        except IntegrityError:
+                            pass
+
+            for room_id, (rev, state) in snapshots.items():
+                (
+                    db.query(Board)
+                    .filter(Board.id == room_id, Board.rev < rev)
+                    .update({Board.rev: rev, Board.state: state}, synchronize_session=False)
+                )
+                (
+                    db.query(BoardOp)
+                    .filter(BoardOp.board_id == room_id, BoardOp.rev <= rev)
+                    .delete(synchronize_session=False)
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def start(self) -> None:
+        if self._task is None:
+            # bound to the running loop, so created here rather than in __init__
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._flusher())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flusher(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
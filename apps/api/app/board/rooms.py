@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import logging
+import re
+import time
+from typing import Any
+
+from app.board.backends import BoardBackend
+from app.board.coalesce import PatchBuffer
+from app.board.connection import BoardConnection, Frame
+from app.board.persistence import BoardPersister
+from app.board.state import OP_REPLACE, BoardState
+from app.core import metrics
+
+log = logging.getLogger(__name__)
+
+TOPIC = "board"
+# how long a worker keeps events around for replay while waiting for a peer's
+# sync_state; past this it assumes nobody else holds the room
+SYNC_REPLY_WAIT_SECONDS = 10.0
+DEFAULT_ROOM = "default"
+ROOM_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def is_valid_room_id(room_id: str) -> bool:
+    return bool(ROOM_ID_RE.match(room_id))
+
+
+# Ops are applied as soon as they are delivered, but patches go out at most
+# once per tick (`tick_seconds`, 0 to send every event on its own). An event
+# after a quiet tick is sent right away; later ones in the same tick are
+# merged into the next frame. The last `history_size` patch frames are kept
+# so a reconnecting client can catch up from its last revision.
+class BoardRoom:
+    def __init__(
+        self, room_id: str, max_avatars: int, tick_seconds: float = 0.0, history_size: int = 0
+    ) -> None:
+        self.room_id = room_id
+        self.state = BoardState(max_avatars)
+        self.connections: set[BoardConnection] = set()
+        self.last_active = time.monotonic()
+        self.tick_seconds = tick_seconds
+        # shared by every connection that asks for one until the state changes
+        self._snapshot: Frame | None = None
+        self._pending = PatchBuffer()
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._last_flush = 0.0
+        # (baseRev, frame) of recent patches, contiguous: each starts where the previous ended
+        self._history: deque[tuple[int, Frame]] = deque(maxlen=history_size)
+
+    def join(self, conn: BoardConnection) -> None:
+        self.connections.add(conn)
+        self.last_active = time.monotonic()
+
+    def leave(self, conn: BoardConnection) -> None:
+        self.connections.discard(conn)
+        self.last_active = time.monotonic()
+
+    def snapshot_frame(self) -> Frame:
+        # queued patches go out first; the snapshot then supersedes them in
+        # the queue of whoever asked for it
+        self.flush()
+        if self._snapshot is None:
+            message = {"type": "snapshot", "rev": self.state.rev, "payload": self.state.snapshot()}
+            self._snapshot = Frame(self.state.rev, message, is_snapshot=True)
+        return self._snapshot
+
+    # the patches taking a client at revision `since` to the current one
+    # (empty when it is up to date), or None when history doesn't reach back
+    # that far and it needs a snapshot
+    def frames_since(self, since: int) -> list[Frame] | None:
+        self.flush()
+        if since == self.state.rev:
+            return []
+        for i, (base_rev, _) in enumerate(self._history):
+            if base_rev == since:
+                return [frame for _, frame in list(self._history)[i:]]
+        return None
+
+    def broadcast(self, frame: Frame) -> None:
+        # serialized once by the caller; each connection only enqueues the text
+        started = time.perf_counter()
+        for conn in list(self.connections):
+            if conn.closed:
+                self.connections.discard(conn)
+                continue
+            conn.send(frame)
+        metrics.board_broadcast_seconds.observe(time.perf_counter() - started)
+
+    def apply_ops(self, ops: list[Any], origin: str) -> list[dict[str, Any]] | None:
+        applied = [op for op in (self.state.apply(raw) for raw in ops) if op is not None]
+        if not applied:
+            return None
+        base_rev = self.state.rev
+        self.state.rev += 1
+        self.last_active = time.monotonic()
+        self._snapshot = None
+        self._pending.add(base_rev, self.state.rev, origin, applied)
+        self._schedule_flush()
+        return applied
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is not None:
+            return
+        delay = self._last_flush + self.tick_seconds - time.monotonic()
+        if delay <= 0:
+            self.flush()
+        else:
+            self._flush_handle = asyncio.get_running_loop().call_later(delay, self.flush)
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        frame = self._pending.frame()
+        if self._history.maxlen:
+            self._history.append((self._pending.base_rev, frame))
+        self._pending = PatchBuffer()
+        self._last_flush = time.monotonic()
+        self.broadcast(frame)
+
+    def _discard_pending(self) -> None:
+        # a snapshot of the new state is about to go out and covers them; older
+        # patches can't be replayed across it either
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._pending = PatchBuffer()
+        self._history.clear()
+
+    def replace(self, payload: dict[str, Any]) -> None:
+        self.state.replace(payload)
+        self.state.rev += 1
+        self.last_active = time.monotonic()
+        self._snapshot = None
+        self._discard_pending()
+        self.broadcast(self.snapshot_frame())
+
+    def load(self, rev: int, payload: dict[str, Any]) -> None:
+        # adopt a peer's state wholesale; local subscribers get a fresh snapshot
+        self.state.replace(payload)
+        self.state.rev = rev
+        self._snapshot = None
+        self._discard_pending()
+        self.broadcast(self.snapshot_frame())
+
+
+# Writes go through the backend and are applied when it delivers them back, so
+# every worker holding a room applies the same events in the same order.
+class RoomRegistry:
+    def __init__(
+        self,
+        backend: BoardBackend,
+        idle_seconds: float,
+        max_avatars: int,
+        tick_seconds: float = 0.0,
+        history_size: int = 0,
+        persister: BoardPersister | None = None,
+    ) -> None:
+        self.backend = backend
+        self.idle_seconds = idle_seconds
+        self.max_avatars = max_avatars
+        self.tick_seconds = tick_seconds
+        self.history_size = history_size
+        self.persister = persister
+        self._rooms: dict[str, BoardRoom] = {}
+        self._loading: dict[str, asyncio.Task[BoardRoom]] = {}
+        self._task: asyncio.Task[None] | None = None
+        self._pending: set[asyncio.Task[Any]] = set()
+        # room id -> (deadline, rev when we asked, events delivered since) while
+        # waiting for a peer's sync_state
+        self._syncing: dict[str, tuple[float, int, list[dict[str, Any]]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def connections(self) -> list[BoardConnection]:
+        return [conn for room in self._rooms.values() for conn in room.connections if not conn.closed]
+
+    async def open(self, room_id: str) -> BoardRoom:
+        room = self._rooms.get(room_id)
+        if room is not None:
+            return room
+        # concurrent joins of a cold room share one rehydration
+        task = self._loading.get(room_id)
+        if task is None:
+            task = asyncio.create_task(self._load(room_id))
+            self._loading[room_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(room_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, room_id: str) -> BoardRoom:
+        room = BoardRoom(room_id, self.max_avatars, self.tick_seconds, self.history_size)
+        if self.persister is not None:
+            try:
+                rev, state, tail = await self.persister.load(room_id)
+            except Exception:
+                log.exception("Failed to rehydrate board room %s; starting empty.", room_id)
+            else:
+                room.state.replace(state)
+                room.state.rev = rev
+                for tail_rev, ops in tail:
+                    room.state.replay(tail_rev, ops)
+        self._rooms[room_id] = room
+        if self.backend.shared:
+            # another worker may hold a newer copy than the persisted one
+            self._spawn(self._publish(room_id, {"kind": "sync_request"}))
+        return room
+
+    async def submit_ops(self, room_id: str, ops: list[Any], origin: str) -> bool:
+        return await self._publish(room_id, {"kind": "ops", "origin": origin, "ops": ops})
+
+    async def submit_replace(self, room_id: str, payload: dict[str, Any]) -> bool:
+        return await self._publish(room_id, {"kind": "replace", "payload": payload})
+
+    async def _publish(self, room_id: str, message: dict[str, Any]) -> bool:
+        try:
+            await self.backend.publish(TOPIC, room_id, message)
+        except Exception:
+            log.exception("Failed to publish board event for room %s.", room_id)
+            return False
+        return True
+
+    def _dispatch(self, room_id: str, message: dict[str, Any]) -> None:
+        room = self._rooms.get(room_id)
+        if room is None:
+            # nobody on this worker is subscribed
+            return
+        kind = message.get("kind")
+        worker = message.get("worker")
+
+        if kind in ("ops", "replace"):
+            self._apply(room, message)
+            syncing = self._syncing.get(room_id)
+            if syncing is not None:
+                if time.monotonic() < syncing[0]:
+                    syncing[2].append(message)
+                else:
+                    del self._syncing[room_id]
+        elif kind == "sync_request":
+            if worker == self.backend.worker_id:
+                # a peer's reply reflects the stream up to this point; whatever
+                # comes after has to be replayed on top of it
+                self._syncing[room_id] = (time.monotonic() + SYNC_REPLY_WAIT_SECONDS, room.state.rev, [])
+            elif room.state.rev > 0:
+                reply = {
+                    "kind": "sync_state",
+                    "to": worker,
+                    "rev": room.state.rev,
+                    "payload": room.state.snapshot(),
+                }
+                self._spawn(self._publish(room_id, reply))
+        elif kind == "sync_state":
+            rev = message.get("rev")
+            syncing = self._syncing.get(room_id)
+            if message.get("to") != self.backend.worker_id or syncing is None or not isinstance(rev, int):
+                return
+            del self._syncing[room_id]
+            if rev <= syncing[1]:
+                return
+            # adopt the peer's state as of our request, then re-apply what
+            # arrived since; our revisions now match the peer's
+            room.load(rev, message.get("payload") or {})
+            for event in syncing[2]:
+                self._apply(room, event, persist=False)
+            # revisions we logged from the stale base are superseded
+            self._persist_snapshot(room)
+
+    def _apply(self, room: BoardRoom, message: dict[str, Any], persist: bool = True) -> None:
+        # only the worker that published an event persists it
+        persist = persist and self.persister is not None and message.get("worker") == self.backend.worker_id
+        if message.get("kind") == "ops":
+            ops = message.get("ops")
+            if isinstance(ops, list):
+                applied = room.apply_ops(ops, origin=str(message.get("origin") or ""))
+                if applied and persist:
+                    self.persister.record(room.room_id, room.state.rev, applied, room.state.snapshot_copy)
+        else:
+            room.replace(message.get("payload") or {})
+            if persist:
+                replace_op = {"op": OP_REPLACE, "payload": room.state.snapshot_copy()}
+                self.persister.record(room.room_id, room.state.rev, [replace_op], room.state.snapshot_copy)
+
+    def _reset(self) -> None:
+        # events may have been lost; resync every room we hold from peers
+        for room_id in list(self._rooms):
+            self._spawn(self._publish(room_id, {"kind": "sync_request"}))
+
+    def _spawn(self, coro: Any) -> None:
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def evict_idle(self) -> list[str]:
+        cutoff = time.monotonic() - self.idle_seconds
+        evicted = [
+            room_id
+            for room_id, room in self._rooms.items()
+            if not room.connections and room.last_active < cutoff
+        ]
+        for room_id in evicted:
+            room = self._rooms.pop(room_id)
+            self._syncing.pop(room_id, None)
+            self._persist_snapshot(room)
+        return evicted
+
+    def _persist_snapshot(self, room: BoardRoom) -> None:
+        if self.persister is not None and room.state.rev > 0:
+            self.persister.record_snapshot(room.room_id, room.state.rev, room.state.snapshot_copy())
+
+    async def start(self) -> None:
+        self.backend.subscribe(TOPIC, self._dispatch, on_reset=self._reset)
+        await self.backend.start()
+        if self.persister is not None:
+            self.persister.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._evictor())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.backend.stop()
+        if self.persister is not None:
+            # compact everything on a clean shutdown so restarts replay nothing
+            for room in self._rooms.values():
+                self._persist_snapshot(room)
+            await self.persister.stop()
+
+    async def _evictor(self) -> None:
+        interval = max(self.idle_seconds / 4, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.evict_idle()
+            if evicted:
+                log.info("Evicted %d idle board room(s).", len(evicted))
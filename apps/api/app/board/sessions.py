@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import logging
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.board.connection import CLOSE_SESSION_EXPIRED, CLOSE_SESSION_REVOKED, BoardConnection
+from app.db.models.user import User
+
+log = logging.getLogger(__name__)
+
+BOARD_ROLES = {"USER", "ADMIN"}
+# user ids per IN (...) list
+QUERY_CHUNK = 500
+
+
+# Periodically re-checks every open board socket: sockets whose access token
+# has expired are closed so the client reconnects with a fresh one, and
+# sockets of users that were deactivated, removed or lost board access are
+# closed for good. User status comes from one query per pass (chunked), not
+# one per socket.
+class SessionRevalidator:
+    def __init__(
+        self,
+        connections: Callable[[], list[BoardConnection]],
+        session_factory: Callable[[], AsyncSession],
+        interval_seconds: float,
+    ) -> None:
+        self._connections = connections
+        self._session_factory = session_factory
+        self._interval = interval_seconds
+        self._task: asyncio.Task[None] | None = None
+
+    async def revalidate(self) -> int:
+        now = time.time()
+        live: list[BoardConnection] = []
+        closed = 0
+        for conn in self._connections():
+            if conn.expires_at is not None and conn.expires_at <= now:
+                conn.close(CLOSE_SESSION_EXPIRED)
+                closed += 1
+            else:
+                live.append(conn)
+
+        user_ids = sorted({conn.user_id for conn in live})
+        allowed: set[str] = set()
+        async with self._session_factory() as db:
+            for i in range(0, len(user_ids), QUERY_CHUNK):
+                rows = await db.execute(
+                    select(User.id).where(
+                        User.id.in_(user_ids[i : i + QUERY_CHUNK]),
+                        User.is_active.is_(True),
+                        User.role.in_(BOARD_ROLES),
+                    )
+                )
+                allowed.update(rows.scalars())
+
+        for conn in live:
+            if conn.user_id not in allowed:
+                conn.close(CLOSE_SESSION_REVOKED)
+                closed += 1
+        return closed
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._revalidator())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _revalidator(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                closed = await self.revalidate()
+                if closed:
+                    log.info("Closed %d stale board session(s).", closed)
+            except Exception:
+                log.exception("Board session revalidation failed.")
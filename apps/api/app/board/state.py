@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import Any
+
+from app.board.model import MAX_MAP_VIEWS, MapView, PlacedAvatar, valid_id
+
+# Ops accepted from clients. Each op touches a single avatar or map so a
+# drag only costs the bytes of that avatar, not the whole board.
+OP_ADD = "add"
+OP_MOVE = "move"
+OP_UPDATE = "update"
+OP_REMOVE = "remove"
+OP_SELECT_MAP = "select_map"
+OP_SET_VIEW = "set_view"
+# only written to the persisted op log, for legacy full-state writes
+OP_REPLACE = "replace"
+
+
+class BoardState:
+    def __init__(self, max_avatars: int) -> None:
+        self.rev = 0
+        self.max_avatars = max_avatars
+        self.selected_map_id = ""
+        self.avatars: dict[str, PlacedAvatar] = {}
+        self.map_views: dict[str, MapView] = {}
+
+    def snapshot(self) -> dict[str, Any]:
+        # built from the typed model, so it is always a detached copy
+        return {
+            "selectedMapId": self.selected_map_id,
+            "placedAvatars": [avatar.to_json() for avatar in self.avatars.values()],
+            "mapViews": {map_id: view.to_json() for map_id, view in self.map_views.items()},
+        }
+
+    def snapshot_copy(self) -> dict[str, Any]:
+        # safe to hand to another thread while the room keeps mutating
+        return self.snapshot()
+
+    def replay(self, rev: int, ops: list[Any]) -> None:
+        # re-applies a persisted revision
+        for op in ops:
+            if isinstance(op, dict) and op.get("op") == OP_REPLACE:
+                self.replace(op.get("payload") or {})
+            else:
+                self.apply(op)
+        self.rev = rev
+
+    def replace(self, payload: Any) -> None:
+        # full-state write, kept for clients that still send {"type": "state"};
+        # invalid entries are dropped and the lists cut at their limits
+        if not isinstance(payload, dict):
+            payload = {}
+        map_id = payload.get("selectedMapId") or ""
+        self.selected_map_id = map_id if valid_id(map_id) else ""
+        self.avatars = {}
+        avatars = payload.get("placedAvatars")
+        for raw in avatars if isinstance(avatars, list) else []:
+            if len(self.avatars) >= self.max_avatars:
+                break
+            avatar = PlacedAvatar.from_json(raw)
+            if avatar is not None:
+                self.avatars[avatar.id] = avatar
+        self.map_views = {}
+        views = payload.get("mapViews")
+        for view_map_id, raw in (views.items() if isinstance(views, dict) else []):
+            if len(self.map_views) >= MAX_MAP_VIEWS:
+                break
+            view = MapView.from_json(raw)
+            if view is not None and valid_id(view_map_id):
+                self.map_views[view_map_id] = view
+
+    def apply(self, op: Any) -> dict[str, Any] | None:
+        # returns the normalized op to fan out, or None when the op is rejected
+        if not isinstance(op, dict):
+            return None
+        kind = op.get("op")
+
+        if kind == OP_SELECT_MAP:
+            map_id = op.get("mapId") or ""
+            if map_id and valid_id(map_id) is None:
+                return None
+            self.selected_map_id = map_id
+            return {"op": kind, "mapId": map_id}
+
+        if kind == OP_SET_VIEW:
+            map_id = valid_id(op.get("mapId"))
+            view = MapView.from_json(op.get("view"))
+            if map_id is None or view is None:
+                return None
+            if map_id not in self.map_views and len(self.map_views) >= MAX_MAP_VIEWS:
+                return None
+            self.map_views[map_id] = view
+            return {"op": kind, "mapId": map_id, "view": view.to_json()}
+
+        if kind == OP_ADD:
+            avatar = PlacedAvatar.from_json(op.get("avatar"))
+            if avatar is None:
+                return None
+            if avatar.id not in self.avatars and len(self.avatars) >= self.max_avatars:
+                return None
+            self.avatars[avatar.id] = avatar
+            return {"op": kind, "avatar": avatar.to_json()}
+
+        avatar_id = op.get("id")
+        current = self.avatars.get(avatar_id) if isinstance(avatar_id, str) else None
+        if current is None:
+            return None
+
+        if kind == OP_MOVE:
+            moved = current.move(op.get("x"), op.get("y"))
+            if moved is None:
+                return None
+            return {"op": kind, "id": current.id, "x": moved[0], "y": moved[1]}
+
+        if kind == OP_UPDATE:
+            fields = op.get("fields")
+            applied = current.update(fields) if isinstance(fields, dict) else None
+            if applied is None:
+                return None
+            return {"op": kind, "id": current.id, "fields": applied}
+
+        if kind == OP_REMOVE:
+            del self.avatars[current.id]
+            return {"op": kind, "id": current.id}
+
+        return None
@@ -9,17 +9,92 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = "postgresql+psycopg2://postgres:postgres@db:5432/higor"
+    # pool settings apply to both the sync and the async engine
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
 
     # Auth
     JWT_SECRET: str = "dev-secret"
     ACCESS_MINUTES: int = 15
     REFRESH_DAYS: int = 30
+    # refresh tokens rotate on every use; a rotated token presented again revokes its whole login
+    REFRESH_REUSE_GRACE_SECONDS: float = 10.0  # except right after rotation (parallel tabs racing)
+    REFRESH_REVOKED_RETENTION_DAYS: float = 7.0  # revoked rows are kept this long for reuse detection
+    REFRESH_SWEEP_INTERVAL_SECONDS: float = 3600.0
+    REFRESH_SWEEP_BATCH_SIZE: int = 1000  # rows deleted per transaction
+    # per-process caches: access tokens minted per refresh cookie (kept for the grace window) and rejected cookies
+    REFRESH_CACHE_MAX_ENTRIES: int = 10000
+    REFRESH_NEGATIVE_TTL_SECONDS: float = 300.0
 
     COOKIE_SECURE: bool = False
 
+    # Password hashing (bcrypt) runs on its own bounded pool
+    BCRYPT_ROUNDS: int = 12  # changing it rehashes passwords on next login
+    PASSWORD_WORKERS: int = 2
+    PASSWORD_QUEUE_LIMIT: int = 16  # waiting hashes beyond this are rejected with 503
+
+    # per-process cache of (role, is_active, nickname) for authenticated requests
+    AUTH_CACHE_TTL_SECONDS: float = 60.0
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+
+    # per-process cache of serialized listing bodies, keyed by collection version
+    RESPONSE_CACHE_TTL_SECONDS: float = 300.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 256
+
+    # Metrics: Prometheus text at /api/metrics, per worker process
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: str | None = None  # when set, scrapes must send "Authorization: Bearer <token>"
+
+    # Rate limiting (token buckets)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORE: str = "memory"  # memory (per process) | postgres (shared by all workers)
+    RATE_LIMIT_MAX_KEYS: int = 100000  # buckets kept by the memory store
+    RATE_LIMIT_LOGIN_PER_MINUTE: float = 10  # per client IP
+    RATE_LIMIT_REFRESH_PER_MINUTE: float = 30  # per client IP
+    RATE_LIMIT_UPLOADS_PER_MINUTE: dict[str, float] = {"USER": 20, "ADMIN": 60}  # per user, by role
+    RATE_LIMIT_WS_MESSAGES_PER_SECOND: dict[str, float] = {"USER": 20, "ADMIN": 50}  # board messages per user, by role
+    RATE_LIMIT_WS_CLOSE_SECONDS: float = 5.0  # a board socket over its message budget this long is closed (1008)
+
+    # Asset storage
+    STORAGE_BACKEND: str = "local"  # local (storage/uploads, served by the API) | s3 (needs boto3)
+    S3_BUCKET: str | None = None
+    S3_PUBLIC_URL: str | None = None  # base URL browsers load stored files from (bucket or CDN)
+    S3_ENDPOINT_URL: str | None = None  # for MinIO and other S3-compatible services
+    S3_REGION: str | None = None
+    S3_ACCESS_KEY_ID: str | None = None
+    S3_SECRET_ACCESS_KEY: str | None = None
+    UPLOAD_PRESIGN_SECONDS: int = 900  # lifetime of presigned direct-upload URLs and their tickets
+    ASSET_MAX_BYTES: int = 25 * 1024 * 1024  # per uploaded file, proxied or direct
+    # with local storage behind nginx, e.g. "/_uploads": nginx sends the files (see apps/web/nginx.conf)
+    STORAGE_ACCEL_REDIRECT_PREFIX: str | None = None
+
+    # Asset image pipeline (runs after upload)
+    ASSET_PIPELINE_WORKERS: int = 2
+    ASSET_VARIANT_SIZES: list[int] = [256, 1024, 2048]  # max edge of each WebP variant; the smallest is the thumbnail
+    ASSET_CELL_PX: int = 40  # board grid size in pixels, used to derive width/height in cells
+
     BOOTSTRAP_ADMIN_ENABLED: bool = True
     BOOTSTRAP_ADMIN_NICKNAME: str | None = None
     BOOTSTRAP_ADMIN_PASSWORD: str | None = None
 
+    # Board WebSocket
+    BOARD_BACKEND: str = "memory"  # memory | postgres (LISTEN/NOTIFY, needed for multiple workers)
+    BOARD_SEND_QUEUE_MAX: int = 64  # queued frames per socket before collapsing to a snapshot
+    BOARD_SLOW_CONSUMER_SECONDS: float = 5.0  # max send lag before a socket is dropped
+    BOARD_ROOM_IDLE_SECONDS: float = 600.0  # empty rooms are evicted after this long
+    # open sockets are re-checked this often: expired tokens (close 4001) and inactive users (close 4003)
+    BOARD_REVALIDATE_SECONDS: float = 30.0
+    BOARD_TICK_HZ: float = 25.0  # max patch frames per room per second; ops in between are merged (0 = no merging)
+    # recent patch frames kept per room for reconnect catch-up (?since=<rev>); older gaps get a snapshot
+    BOARD_HISTORY_SIZE: int = 64
+    BOARD_MAX_AVATARS: int = 200  # per room; further adds are rejected
+    BOARD_MAX_MESSAGE_BYTES: int = 64 * 1024  # larger client messages close the socket (1009)
+    BOARD_PERSIST_ENABLED: bool = True
+    BOARD_FLUSH_INTERVAL_SECONDS: float = 1.0
+    BOARD_FLUSH_MAX_OPS: int = 200  # flush early once this many revisions are buffered
+    BOARD_SNAPSHOT_EVERY: int = 500  # compact a room into a snapshot every N revisions
+
 
 settings = Settings()
@@ -1,41 +1,136 @@
 from __future__ import annotations
 
+import logging
+import time
+from typing import Any
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 
+from app.board.backends import BoardBackend
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.db.session import get_db
+from app.core.security import ACCESS_TOKEN_TYPE, ALGORITHM
+from app.db.session import AsyncSessionLocal
 from app.db.models.user import User
 
+log = logging.getLogger(__name__)
+
 bearer = HTTPBearer(auto_error=False)
 
+USERS_TOPIC = "users"
+
+# user_id -> (role, is_active, nickname). Lets the authenticated hot path skip
+# the users SELECT; entries never outlive the token that populated them.
+user_cache: TTLCache[str, tuple[str, bool, str]] = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+)
+
+
+# access token -> decoded claims, so a token is verified once per process
+# rather than on every request and socket
+claims_cache: TTLCache[str, dict[str, Any]] = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+)
+
+
+def _deadline(token_exp: Any) -> float | None:
+    # the token's expiry on the monotonic clock the caches use
+    if not isinstance(token_exp, (int, float)):
+        return None
+    return time.monotonic() + (token_exp - time.time())
+
+
+def verify_access_token(token: str) -> dict[str, Any] | None:
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        claims = jwt.decode(token, settings.JWT_SECRET, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    # tokens issued before "typ" existed have none
+    if not claims.get("sub") or claims.get("typ", ACCESS_TOKEN_TYPE) != ACCESS_TOKEN_TYPE:
+        return None
+    claims_cache.set(token, claims, expires_at=_deadline(claims.get("exp")))
+    return claims
+
+
+# Evicts a user from user_cache on every worker. With a shared backend the
+# eviction travels over the board event channel, like collection versions.
+class UserInvalidations:
+    def __init__(self) -> None:
+        self._backend: BoardBackend | None = None
+
+    def attach(self, backend: BoardBackend) -> None:
+        # must run before backend.start(); after missed events any entry may be stale
+        self._backend = backend
+        backend.subscribe(USERS_TOPIC, self._on_event, on_reset=user_cache.clear)
 
-def get_current_user(
+    async def publish(self, user_id: str) -> None:
+        # gone on this worker before the response that caused it
+        user_cache.pop(user_id)
+        if self._backend is None:
+            return
+        try:
+            await self._backend.publish(USERS_TOPIC, user_id, {})
+        except Exception:
+            log.exception("Failed to publish invalidation of user %s.", user_id)
+
+    def _on_event(self, user_id: str, message: dict[str, Any]) -> None:
+        user_cache.pop(user_id)
+
+
+user_invalidations = UserInvalidations()
+
+
+async def invalidate_user(user_id: str) -> None:
+    await user_invalidations.publish(user_id)
+
+
+async def load_user_status(user_id: str, token_exp: int | None) -> tuple[str, bool, str] | None:
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    # only open a session on a cache miss
+    async with AsyncSessionLocal() as db:
+        row = (
+            await db.execute(select(User.role, User.is_active, User.nickname).where(User.id == user_id))
+        ).first()
+    if row is None:
+        return None
+    cached = (row.role, row.is_active, row.nickname)
+    user_cache.set(user_id, cached, expires_at=_deadline(token_exp))
+    return cached
+
+
+async def get_current_user(
     creds: HTTPAuthorizationCredentials | None = Depends(bearer),
-    db: Session = Depends(get_db),
 ) -> User:
     if not creds:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
-    token = creds.credentials
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=["HS256"])
-        user_id: str | None = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
+    payload = verify_access_token(creds.credentials)
+    if payload is None:
         raise HTTPException(status_code=401, detail="Invalid token")
+    user_id: str = payload["sub"]
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user or not user.is_active:
+    cached = await load_user_status(user_id, payload.get("exp"))
+    if not cached or not cached[1]:
         raise HTTPException(status_code=401, detail="User inactive or not found")
-    return user
+
+    role, is_active, nickname = cached
+    # detached instance: routes only read id/role/nickname from it
+    return User(id=user_id, role=role, is_active=is_active, nickname=nickname)
 
 
 def require_role(*roles: str):
-    def _guard(user: User = Depends(get_current_user)) -> User:
+    async def _guard(user: User = Depends(get_current_user)) -> User:
         if user.role not in roles:
             raise HTTPException(status_code=403, detail="Forbidden")
         return user
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator
+from contextvars import ContextVar
+import math
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Minimal Prometheus text exposition (format 0.0.4), no client library. Hot
+# paths only bump numbers under a per-metric lock; sums, cumulative buckets
+# and callback gauges are worked out at scrape time.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self.samples()
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]: ...
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, labels: Labels = ()) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values]
+
+
+# Set directly, or computed on scrape by `set_function` (a number, or a dict
+# of label values -> number), which costs the hot path nothing.
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[Labels, float] = {}
+        self._function: Callable[[], float | dict[Labels, float]] | None = None
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function: Callable[[], float | dict[Labels, float]]) -> None:
+        self._function = function
+
+    def samples(self) -> Iterable[str]:
+        if self._function is not None:
+            result = self._function()
+            values = list(result.items()) if isinstance(result, dict) else [((), result)]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Labels = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+        lines = []
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics.values() for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+)
+http_request_db_queries = Histogram(
+    "http_request_db_queries", "Database queries issued per HTTP request.", ("route",), buckets=COUNT_BUCKETS
+)
+http_request_db_seconds = Histogram(
+    "http_request_db_seconds", "Time spent in database queries per HTTP request.", ("route",)
+)
+db_query_seconds = Histogram("db_query_duration_seconds", "Database query execution time.", ("engine",))
+db_pool_wait_seconds = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waited for a pooled database connection.", ("engine",)
+)
+db_pool_connections = Gauge(
+    "db_pool_connections", "Pooled database connections by state.", ("engine", "state")
+)
+password_hash_seconds = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time.", buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5)
+)
+password_queue_wait_seconds = Histogram("password_queue_wait_seconds", "Time bcrypt jobs waited for a worker.")
+password_rejected = Counter("password_rejected_total", "bcrypt jobs shed because the pool was saturated.")
+board_connections = Gauge("board_connections", "Open board WebSocket connections.")
+board_rooms = Gauge("board_rooms", "Board rooms held by this worker.")
+board_connections_opened = Counter("board_connections_opened_total", "Board WebSocket connections accepted.")
+board_broadcast_seconds = Histogram(
+    "board_broadcast_duration_seconds",
+    "Time to fan one frame out to a room's send queues.",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025),
+)
+board_send_lag_seconds = Histogram(
+    "board_send_lag_seconds", "Time a frame waited in a connection's send queue before being written."
+)
+board_send_queue_frames = Gauge(
+    "board_send_queue_frames", "Frames waiting in board send queues (max over connections, and total).", ("stat",)
+)
+
+
+# Per-request database tally, shared with the query hooks through a context
+# variable; asyncio.to_thread and SQLAlchemy's async greenlets carry it along.
+class _RequestStats:
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+_request_stats: ContextVar[_RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn: Any, cursor: Any, statement: Any, parameters: Any, context: Any, executemany: bool) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn: Any, cursor: Any, statement: Any, parameters: Any, context: Any, executemany: bool) -> None:
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_query_seconds.observe(elapsed, (name,))
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context: Any) -> None:
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def observe_pool_wait(name: str, seconds: float) -> None:
+    db_pool_wait_seconds.observe(seconds, (name,))
+
+
+# Pure ASGI, so it adds no task hops the way BaseHTTPMiddleware would. The
+# route label is the matched path template, never the raw path.
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+        stats = _RequestStats()
+        token = _request_stats.set(stats)
+
+        async def _send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_seconds.observe(time.perf_counter() - started, (scope["method"], path, str(status)))
+            http_request_db_queries.observe(stats.queries, (path,))
+            http_request_db_seconds.observe(stats.query_seconds, (path,))
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+import logging
+import math
+import time
+from typing import NamedTuple
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import delete, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.deps import get_current_user
+from app.db.models.rate_limit import RateLimitBucket
+from app.db.models.user import User
+from app.db.session import async_engine
+
+log = logging.getLogger(__name__)
+
+
+class Budget(NamedTuple):
+    rate: float  # tokens added per second
+    burst: float  # bucket size
+
+
+def per_minute(count: float) -> Budget:
+    # bursts up to a full minute's worth
+    return Budget(count / 60, count)
+
+
+def per_second(count: float) -> Budget:
+    # bursts up to two seconds' worth
+    return Budget(count, count * 2)
+
+
+# Buckets in this process. Least recently used keys are dropped past
+# `maxsize`, which at worst hands an idle client a full bucket.
+class MemoryStore:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    # seconds until `cost` tokens are available; 0 means they were taken
+    def take_now(self, key: str, budget: Budget, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (budget.burst, now))
+        tokens = min(budget.burst, tokens + (now - updated_at) * budget.rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / budget.rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def take(self, key: str, budget: Budget, cost: float = 1.0) -> float:
+        return self.take_now(key, budget, cost)
+
+
+# Buckets in Postgres, shared by every worker. Refill and take happen in one
+# upsert, so concurrent requests can't overdraw a bucket.
+class PostgresStore:
+    # delete buckets idle this long (full again by then) every N takes
+    PRUNE_IDLE_SECONDS = 3600
+    PRUNE_EVERY = 1000
+
+    def __init__(self) -> None:
+        self._takes = 0
+
+    async def take(self, key: str, budget: Budget, cost: float = 1.0) -> float:
+        table = RateLimitBucket.__table__
+        now = func.now()
+        refilled = func.least(
+            literal(budget.burst),
+            table.c.tokens + func.extract("epoch", now - table.c.updated_at) * budget.rate,
+        )
+        stmt = pg_insert(table).values(key=key, tokens=budget.burst - cost, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"tokens": refilled - cost, "updated_at": now},
+            # an empty bucket keeps its row untouched and nothing is returned
+            where=refilled >= cost,
+        ).returning(table.c.tokens)
+
+        async with async_engine.begin() as conn:
+            taken = (await conn.execute(stmt)).first()
+        self._takes += 1
+        if self._takes % self.PRUNE_EVERY == 0:
+            await self._prune()
+        # exact wait needs the bucket's level; one token's refill time is close enough
+        return 0.0 if taken is not None else cost / budget.rate
+
+    async def _prune(self) -> None:
+        table = RateLimitBucket.__table__
+        async with async_engine.begin() as conn:
+            await conn.execute(
+                delete(table).where(
+                    table.c.updated_at < datetime.now(timezone.utc) - timedelta(seconds=self.PRUNE_IDLE_SECONDS)
+                )
+            )
+
+
+def create_store(name: str) -> MemoryStore | PostgresStore:
+    if name == "memory":
+        return MemoryStore(settings.RATE_LIMIT_MAX_KEYS)
+    if name == "postgres":
+        return PostgresStore()
+    raise ValueError(f"Unknown RATE_LIMIT_STORE: {name}")
+
+
+store = create_store(settings.RATE_LIMIT_STORE)
+# WebSocket messages are checked per frame, far too often for a database round trip
+local_store = store if isinstance(store, MemoryStore) else MemoryStore(settings.RATE_LIMIT_MAX_KEYS)
+
+
+async def check(key: str, budget: Budget) -> None:
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    try:
+        wait = await store.take(key, budget)
+    except Exception:
+        # a limiter outage must not take the API down with it
+        log.exception("Rate limit store failed; letting %s through.", key)
+        return
+    if wait > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+def client_ip(request: Request) -> str:
+    # uvicorn resolves X-Forwarded-For from trusted proxies (--forwarded-allow-ips)
+    return request.client.host if request.client else "unknown"
+
+
+def role_budget(budgets: dict[str, float], role: str, unit: Callable[[float], Budget] = per_minute) -> Budget:
+    # unknown roles get the smallest budget
+    return unit(budgets.get(role, min(budgets.values())))
+
+
+def limit_by_ip(scope: str, budget: Budget):
+    async def _limit(request: Request) -> None:
+        await check(f"{scope}:ip:{client_ip(request)}", budget)
+
+    return _limit
+
+
+def limit_by_user(scope: str, budgets: dict[str, float]):
+    async def _limit(user: User = Depends(get_current_user)) -> None:
+        await check(f"{scope}:user:{user.id}", role_budget(budgets, user.role))
+
+    return _limit
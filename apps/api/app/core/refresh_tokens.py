@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+import logging
+import uuid
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import create_refresh_token_raw, hash_refresh_token
+from app.db.models.refresh_token import RefreshToken
+from app.db.session import SessionLocal
+
+log = logging.getLogger(__name__)
+
+
+# A new token row (not yet added to a session) and its raw value for the
+# cookie. Without `family_id` the token starts a new family, i.e. a login.
+def new_refresh_token(user_id: str, family_id: str | None = None) -> tuple[str, RefreshToken]:
+    raw = create_refresh_token_raw()
+    token_id = str(uuid.uuid4())
+    rt = RefreshToken(
+        id=token_id,
+        user_id=user_id,
+        token_hash=hash_refresh_token(raw),
+        family_id=family_id or token_id,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_DAYS),
+    )
+    return raw, rt
+
+
+# Retires `rt` in favour of `new_id`. Conditional, so of two requests racing
+# with the same cookie exactly one rotates; False for the loser.
+async def mark_rotated(db: AsyncSession, rt: RefreshToken, new_id: str, now: datetime) -> bool:
+    result = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == rt.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now, replaced_by_id=new_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def revoke_family(db: AsyncSession, family_id: str, now: datetime) -> None:
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Collapses refreshes of one session: tabs waking on the same access-token
+# expiry present the same cookie at once. The first request on this worker
+# does the database work; concurrent ones await it, and later ones within the
+# reuse grace window get the access token it minted.
+class RefreshCoalescer:
+    def __init__(self, ttl_seconds: float, maxsize: int) -> None:
+        # refresh hash -> access token minted for it
+        self.minted: TTLCache[str, str] = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self._inflight: dict[str, asyncio.Future[str]] = {}
+
+    async def run(self, token_hash: str, mint: Callable[[], Awaitable[str]]) -> str:
+        access = self.minted.get(token_hash)
+        if access is not None:
+            return access
+        while (pending := self._inflight.get(token_hash)) is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # the leader's client went away; take over
+        access = self.minted.get(token_hash)
+        if access is not None:
+            return access
+
+        future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        # followers re-raise the leader's error; without any, nobody reads it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[token_hash] = future
+        try:
+            access = await mint()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._inflight[token_hash]
+        self.minted.set(token_hash, access)
+        future.set_result(access)
+        return access
+
+    def forget(self, token_hash: str) -> None:
+        self.minted.pop(token_hash)
+
+
+coalescer = RefreshCoalescer(
+    ttl_seconds=settings.REFRESH_REUSE_GRACE_SECONDS,
+    maxsize=settings.REFRESH_CACHE_MAX_ENTRIES,
+)
+
+# refresh hash -> 401 detail, for cookies that can never succeed again
+# (unknown, expired, logged out, reused); garbage cookies skip the database
+rejected_hashes: TTLCache[str, str] = TTLCache(
+    maxsize=settings.REFRESH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.REFRESH_NEGATIVE_TTL_SECONDS,
+)
+
+
+# Deletes expired tokens and tokens revoked longer ago than the retention
+# window (kept that long so a replayed rotated token is still recognised as
+# reuse). Works in short transactions of at most `batch_size` rows; SKIP
+# LOCKED lets the sweepers of several workers run side by side.
+class RefreshTokenSweeper:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        interval_seconds: float,
+        batch_size: int,
+        revoked_retention: timedelta,
+    ) -> None:
+        self._session_factory = session_factory
+        self._interval = interval_seconds
+        self._batch_size = batch_size
+        self._revoked_retention = revoked_retention
+        self._task: asyncio.Task[None] | None = None
+
+    def sweep_batch(self) -> int:
+        now = datetime.now(timezone.utc)
+        doomed = (
+            select(RefreshToken.id)
+            .where(
+                or_(
+                    RefreshToken.expires_at < now,
+                    RefreshToken.revoked_at < now - self._revoked_retention,
+                )
+            )
+            .limit(self._batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        db = self._session_factory()
+        try:
+            result = db.execute(
+                delete(RefreshToken)
+                .where(RefreshToken.id.in_(doomed.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return result.rowcount
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def sweep(self) -> int:
+        total = 0
+        while True:
+            deleted = await asyncio.to_thread(self.sweep_batch)
+            total += deleted
+            if deleted < self._batch_size:
+                return total
+            # give request traffic the connection pool between batches
+            await asyncio.sleep(0)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweeper())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sweeper(self) -> None:
+        while True:
+            try:
+                deleted = await self.sweep()
+                if deleted:
+                    log.info("Swept %d refresh token(s).", deleted)
+            except Exception:
+                log.exception("Refresh token sweep failed.")
+            await asyncio.sleep(self._interval)
+
+
+sweeper = RefreshTokenSweeper(
+    SessionLocal,
+    interval_seconds=settings.REFRESH_SWEEP_INTERVAL_SECONDS,
+    batch_size=settings.REFRESH_SWEEP_BATCH_SIZE,
+    revoked_retention=timedelta(days=settings.REFRESH_REVOKED_RETENTION_DAYS),
+)
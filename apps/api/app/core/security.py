@@ -1,29 +1,130 @@
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 import secrets
 import hashlib
+import threading
+import time
 
 from jose import jwt
 from passlib.context import CryptContext
 
+from app.core import metrics
+from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+T = TypeVar("T")
+
+# Pinning min/max desired rounds to the configured cost makes passlib flag any
+# hash made with a different cost, so login can transparently rehash it.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_desired_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_desired_rounds=settings.BCRYPT_ROUNDS,
+)
 ALGORITHM = "HS256"
+# "typ" claim of access tokens; other tokens signed with JWT_SECRET (upload
+# tickets) carry their own type and audience so they never pass as one
+ACCESS_TOKEN_TYPE = "access"
+
+
+class PasswordPoolBusy(RuntimeError):
+    pass
+
+
+class PasswordPoolStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    def observe(self, queue_wait: float, hash_time: float) -> None:
+        with self._lock:
+            self.completed += 1
+            self.queue_wait_seconds += queue_wait
+            self.hash_seconds += hash_time
+        metrics.password_queue_wait_seconds.observe(queue_wait)
+        metrics.password_hash_seconds.observe(hash_time)
+
+    def reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+        metrics.password_rejected.inc()
+
+
+# Dedicated executor for bcrypt so password work never occupies more than
+# `workers` CPUs, and callers beyond `workers + queue_limit` are shed at once
+# instead of piling up on the shared request threadpool.
+class PasswordPool:
+    def __init__(self, workers: int, queue_limit: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self.stats = PasswordPoolStats()
+
+    def _submit(self, fn: Callable[..., T], *args: Any) -> Future[T]:
+        if not self._slots.acquire(blocking=False):
+            self.stats.reject()
+            raise PasswordPoolBusy("Password worker pool saturated")
+        enqueued = time.perf_counter()
+
+        def _run() -> T:
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.stats.observe(started - enqueued, time.perf_counter() - started)
+
+        try:
+            future = self._executor.submit(_run)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn: Callable[..., T], *args: Any) -> T:
+        return self._submit(fn, *args).result()
+
+    async def arun(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+
+password_pool = PasswordPool(settings.PASSWORD_WORKERS, settings.PASSWORD_QUEUE_LIMIT)
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_pool.run(pwd_context.hash, password)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    return pwd_context.verify(password, password_hash)
+    return password_pool.run(pwd_context.verify, password, password_hash)
+
+
+def verify_and_update_password(password: str, password_hash: str) -> tuple[bool, str | None]:
+    # returns (valid, new_hash); new_hash is set when the stored cost is outdated
+    return password_pool.run(pwd_context.verify_and_update, password, password_hash)
+
+
+# async variants for request handlers: await the pool instead of blocking a thread
+async def hash_password_async(password: str) -> str:
+    return await password_pool.arun(pwd_context.hash, password)
+
+
+async def verify_and_update_password_async(password: str, password_hash: str) -> tuple[bool, str | None]:
+    return await password_pool.arun(pwd_context.verify_and_update, password, password_hash)
 
 
 def create_access_token(subject: str, role: str, secret: str, minutes: int) -> str:
     now = datetime.now(timezone.utc)
     payload: dict[str, Any] = {
+        "typ": ACCESS_TOKEN_TYPE,
         "sub": subject,
         "role": role,
         "iat": int(now.timestamp()),
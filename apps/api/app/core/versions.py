@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import hashlib
+import logging
+import secrets
+from typing import Any
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+
+from app.board.backends import BoardBackend
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.models.asset import Asset, AssetBlob
+from app.db.models.user import User
+from app.db.session import AsyncSessionLocal
+
+log = logging.getLogger(__name__)
+
+TOPIC = "collections"
+
+ASSETS = "assets"
+USERS = "users"
+
+# Summaries of the rows each listing is built from; any write that changes a
+# listing changes its row. Assets have no updated_at, so image pipeline results
+# are counted on the blobs instead.
+_FINGERPRINTS = {
+    ASSETS: select(
+        func.count(Asset.id),
+        func.max(Asset.created_at),
+        select(func.count(AssetBlob.width)).scalar_subquery(),
+    ),
+    USERS: select(func.count(User.id), func.max(User.updated_at)),
+}
+
+
+# Opaque version token per collection, replaced on every write. Workers start
+# from a digest of the collection's data, so they agree with each other and a
+# restarted worker only reissues an ETag when the data is unchanged; bumps are
+# random rather than counters for the same reason. With a shared backend, bumps
+# reach the other workers through the same channel as board events.
+class CollectionVersions:
+    def __init__(self) -> None:
+        self._tokens: dict[str, str] = {}
+        self._backend: BoardBackend | None = None
+        self._reseed: asyncio.Task[None] | None = None
+
+    def attach(self, backend: BoardBackend) -> None:
+        # must run before backend.start()
+        self._backend = backend
+        backend.subscribe(TOPIC, self._on_event, on_reset=self._on_reset)
+
+    async def seed(self) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                for collection, stmt in _FINGERPRINTS.items():
+                    row = (await db.execute(stmt)).one()
+                    digest = hashlib.blake2b(repr(tuple(row)).encode("utf-8"), digest_size=8).hexdigest()
+                    # a bump delivered meanwhile is newer than what we read
+                    self._tokens.setdefault(collection, digest)
+        except Exception:
+            log.exception("Failed to seed collection versions; falling back to random tokens.")
+
+    def current(self, collection: str) -> str:
+        token = self._tokens.get(collection)
+        if token is None:
+            token = self._tokens[collection] = secrets.token_hex(8)
+        return token
+
+    async def bump(self, collection: str) -> None:
+        token = secrets.token_hex(8)
+        # visible on this worker before the response that caused the write
+        self._tokens[collection] = token
+        if self._backend is None:
+            return
+        try:
+            await self._backend.publish(TOPIC, collection, {"token": token})
+        except Exception:
+            log.exception("Failed to publish %s version bump.", collection)
+
+    def _on_reset(self) -> None:
+        # bumps may have been missed; start over from the data itself
+        self._tokens.clear()
+        self._reseed = asyncio.create_task(self.seed())
+
+    def _on_event(self, collection: str, message: dict[str, Any]) -> None:
+        token = message.get("token")
+        if isinstance(token, str):
+            self._tokens[collection] = token
+
+
+versions = CollectionVersions()
+
+# (collection, token, query) -> (etag, body)
+response_cache: TTLCache[tuple[str, str, str], tuple[str, bytes]] = TTLCache(
+    maxsize=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+)
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in header.split(","))
+
+
+# Serves a collection listing from the body cache, or 304 when the client
+# already holds the current version. `build` only runs on a miss and returns
+# the serialized body.
+async def cached_json(
+    request: Request,
+    collection: str,
+    build: Callable[[], Awaitable[str]],
+) -> Response:
+    # read before querying: a write racing the query then lands under the old
+    # token, which is already stale
+    token = versions.current(collection)
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    digest = hashlib.blake2b(f"{token}:{query}".encode("utf-8"), digest_size=12).hexdigest()
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (collection, token, query)
+    cached = response_cache.get(key)
+    if cached is None:
+        cached = (etag, (await build()).encode("utf-8"))
+        response_cache.set(key, cached)
+    return Response(content=cached[1], media_type="application/json", headers=headers)
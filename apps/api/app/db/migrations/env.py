@@ -11,7 +11,9 @@ from app.db.base import Base
 # Import models so Alembic can detect metadata
 from app.db.models.user import User  # noqa
 from app.db.models.refresh_token import RefreshToken  # noqa
-from app.db.models.asset import Asset  # noqa
+from app.db.models.asset import Asset, AssetBlob  # noqa
+from app.db.models.board import Board, BoardOp  # noqa
+from app.db.models.rate_limit import RateLimitBucket  # noqa
 
 config = context.config
 
@@ -0,0 +1,39 @@
+"""boards
+
+Revision ID: 0002_boards
+Revises: 0001_init
+Create Date: 2026-10-17
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_boards"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "boards",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("rev", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("state", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+
+    op.create_table(
+        "board_ops",
+        sa.Column("board_id", sa.String(), sa.ForeignKey("boards.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("rev", sa.Integer(), primary_key=True),
+        sa.Column("ops", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("board_ops")
+    op.drop_table("boards")
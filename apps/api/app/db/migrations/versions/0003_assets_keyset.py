@@ -0,0 +1,33 @@
+"""assets keyset indexes
+
+Revision ID: 0003_assets_keyset
+Revises: 0002_boards
+Create Date: 2026-10-17
+
+"""
+
+from alembic import op
+
+revision = "0003_assets_keyset"
+down_revision = "0002_boards"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_assets_created_at_id", "assets", ["created_at", "id"])
+    op.create_index("ix_assets_type_created_at_id", "assets", ["type", "created_at", "id"])
+    op.create_index("ix_assets_uploader_created_at_id", "assets", ["uploaded_by_user_id", "created_at", "id"])
+
+    # covered by the leading columns of the composite indexes above
+    op.drop_index("ix_assets_uploaded_by_user_id", table_name="assets")
+    op.drop_index("ix_assets_type", table_name="assets")
+
+
+def downgrade():
+    op.create_index("ix_assets_type", "assets", ["type"])
+    op.create_index("ix_assets_uploaded_by_user_id", "assets", ["uploaded_by_user_id"])
+
+    op.drop_index("ix_assets_uploader_created_at_id", table_name="assets")
+    op.drop_index("ix_assets_type_created_at_id", table_name="assets")
+    op.drop_index("ix_assets_created_at_id", table_name="assets")
@@ -0,0 +1,39 @@
+"""content-addressed asset blobs and image variants
+
+Revision ID: 0004_asset_blobs
+Revises: 0003_assets_keyset
+Create Date: 2026-10-17
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_asset_blobs"
+down_revision = "0003_assets_keyset"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "asset_blobs",
+        sa.Column("digest", sa.String(length=64), primary_key=True),
+        sa.Column("storage_key", sa.String(), nullable=False),
+        sa.Column("content_type", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("width", sa.Integer(), nullable=True),
+        sa.Column("height", sa.Integer(), nullable=True),
+        sa.Column("variants", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.add_column("assets", sa.Column("blob_digest", sa.String(length=64), nullable=True))
+    op.create_foreign_key("fk_assets_blob_digest", "assets", "asset_blobs", ["blob_digest"], ["digest"])
+    op.create_index("ix_assets_blob_digest", "assets", ["blob_digest"])
+
+
+def downgrade():
+    op.drop_index("ix_assets_blob_digest", table_name="assets")
+    op.drop_constraint("fk_assets_blob_digest", "assets", type_="foreignkey")
+    op.drop_column("assets", "blob_digest")
+    op.drop_table("asset_blobs")
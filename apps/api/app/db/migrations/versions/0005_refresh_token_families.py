@@ -0,0 +1,45 @@
+"""refresh token families and sweeper indexes
+
+Revision ID: 0005_refresh_token_families
+Revises: 0004_asset_blobs
+Create Date: 2026-10-17
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_refresh_token_families"
+down_revision = "0004_asset_blobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("refresh_tokens", sa.Column("family_id", sa.String(), nullable=True))
+    op.add_column("refresh_tokens", sa.Column("replaced_by_id", sa.String(), nullable=True))
+    # existing sessions each become their own family
+    op.execute("UPDATE refresh_tokens SET family_id = id")
+    op.alter_column("refresh_tokens", "family_id", nullable=False)
+
+    op.create_index(
+        "ix_refresh_tokens_family_active",
+        "refresh_tokens",
+        ["family_id"],
+        postgresql_where=sa.text("revoked_at IS NULL"),
+    )
+    op.create_index("ix_refresh_tokens_expires_at", "refresh_tokens", ["expires_at"])
+    op.create_index(
+        "ix_refresh_tokens_revoked_at",
+        "refresh_tokens",
+        ["revoked_at"],
+        postgresql_where=sa.text("revoked_at IS NOT NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_refresh_tokens_revoked_at", table_name="refresh_tokens")
+    op.drop_index("ix_refresh_tokens_expires_at", table_name="refresh_tokens")
+    op.drop_index("ix_refresh_tokens_family_active", table_name="refresh_tokens")
+    op.drop_column("refresh_tokens", "replaced_by_id")
+    op.drop_column("refresh_tokens", "family_id")
@@ -0,0 +1,32 @@
+"""shared rate limit buckets
+
+Revision ID: 0006_rate_limit_buckets
+Revises: 0005_refresh_token_families
+Create Date: 2026-10-17
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_rate_limit_buckets"
+down_revision = "0005_refresh_token_families"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rate_limit_buckets",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("tokens", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        # losing buckets on a crash only refills them; skip the WAL
+        prefixes=["UNLOGGED"],
+    )
+    op.create_index("ix_rate_limit_buckets_updated_at", "rate_limit_buckets", ["updated_at"])
+
+
+def downgrade():
+    op.drop_index("ix_rate_limit_buckets_updated_at", table_name="rate_limit_buckets")
+    op.drop_table("rate_limit_buckets")
@@ -1,21 +1,69 @@
+from datetime import datetime, timezone
 import uuid
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, func
+from sqlalchemy import BigInteger, Column, String, DateTime, ForeignKey, Index, Integer, JSON, func
+from sqlalchemy.orm import relationship
 
 from app.db.base import Base
 
 
+# One stored file per distinct content. Assets with identical bytes share a
+# blob.
+class AssetBlob(Base):
+    __tablename__ = "asset_blobs"
+
+    digest = Column(String(64), primary_key=True)  # sha256 hex
+    storage_key = Column(String, nullable=False)  # path under the upload root
+    content_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+
+    # filled by the image pipeline; NULL until it has run
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    # [{width, height, url}] WebP renditions, smallest first
+    variants = Column(JSON, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 class Asset(Base):
     __tablename__ = "assets"
+    __table_args__ = (
+        # keyset pagination on (created_at, id), optionally narrowed by type or uploader;
+        # the leading columns also serve plain type/uploader lookups
+        Index("ix_assets_created_at_id", "created_at", "id"),
+        Index("ix_assets_type_created_at_id", "type", "created_at", "id"),
+        Index("ix_assets_uploader_created_at_id", "uploaded_by_user_id", "created_at", "id"),
+        Index("ix_assets_blob_digest", "blob_digest"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
 
-    type = Column(String, nullable=False, index=True)  # MAP|AVATAR
+    type = Column(String, nullable=False)  # MAP|AVATAR
     name = Column(String, nullable=False)
     file_url = Column(String, nullable=False)
 
-    uploaded_by_user_id = Column(String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    uploaded_by_user_id = Column(String, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+
+    blob_digest = Column(String(64), ForeignKey("asset_blobs.digest"), nullable=True)
+    # many-to-one, so joining it never multiplies rows (keyset pagination stays exact)
+    blob = relationship(AssetBlob, lazy="joined")
 
     width_cells = Column(Integer, nullable=True)
     height_cells = Column(Integer, nullable=True)
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # set client-side too so the keyset cursor round-trips with full precision on every backend
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    @property
+    def variants(self) -> list[dict] | None:
+        return self.blob.variants if self.blob is not None else None
+
+    @property
+    def thumb_url(self) -> str:
+        variants = self.variants
+        return variants[0]["url"] if variants else self.file_url
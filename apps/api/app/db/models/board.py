@@ -0,0 +1,26 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, JSON, func
+
+from app.db.base import Base
+
+
+class Board(Base):
+    __tablename__ = "boards"
+
+    id = Column(String, primary_key=True)  # room id
+
+    # last compacted snapshot; ops with a higher rev live in board_ops
+    rev = Column(Integer, nullable=False, default=0)
+    state = Column(JSON, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class BoardOp(Base):
+    __tablename__ = "board_ops"
+
+    board_id = Column(String, ForeignKey("boards.id", ondelete="CASCADE"), primary_key=True)
+    rev = Column(Integer, primary_key=True)
+    ops = Column(JSON, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Float, DateTime, func
+
+from app.db.base import Base
+
+
+# Token buckets shared by all workers (RATE_LIMIT_STORE=postgres). Rows are
+# disposable: a missing row is a full bucket.
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index, func, text
 
 from app.db.base import Base
 
@@ -12,7 +12,30 @@ class RefreshToken(Base):
 
     token_hash = Column(String, nullable=False, unique=True, index=True)
 
+    # every token rotated out of one login shares the login's family
+    family_id = Column(String, nullable=False)
+    # set together with revoked_at when the token was rotated rather than logged out
+    replaced_by_id = Column(String, nullable=True)
+
     expires_at = Column(DateTime(timezone=True), nullable=False)
     revoked_at = Column(DateTime(timezone=True), nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # live tokens only: family revocation never scans rotated-out rows
+        Index(
+            "ix_refresh_tokens_family_active",
+            "family_id",
+            postgresql_where=text("revoked_at IS NULL"),
+            sqlite_where=text("revoked_at IS NULL"),
+        ),
+        # the sweeper's two predicates
+        Index("ix_refresh_tokens_expires_at", "expires_at"),
+        Index(
+            "ix_refresh_tokens_revoked_at",
+            "revoked_at",
+            postgresql_where=text("revoked_at IS NOT NULL"),
+            sqlite_where=text("revoked_at IS NOT NULL"),
+        ),
+    )
@@ -1,13 +1,97 @@
+import time
+from typing import Any
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
 
+from app.core import metrics
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+# async driver used for each DATABASE_URL backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+# Records how long each checkout waited for a connection (including opening a
+# new one while the pool is below its size).
+class _TimedCheckout:
+    metrics_name = ""
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()  # type: ignore[misc]
+        finally:
+            metrics.observe_pool_wait(self.metrics_name, time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    metrics_name = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+
+def _pool_options(url: str, poolclass: type[Pool]) -> dict[str, Any]:
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": poolclass if settings.METRICS_ENABLED else None,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+
+
+# Sync engine: migrations, startup bootstrap and background workers that run in threads.
+engine = create_engine(
+    settings.DATABASE_URL, pool_pre_ping=True, **_pool_options(settings.DATABASE_URL, TimedQueuePool)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: request handlers.
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    pool_pre_ping=True,
+    **_pool_options(settings.DATABASE_URL, TimedAsyncQueuePool),
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _pool_connections() -> dict[tuple[str, ...], float]:
+    state: dict[tuple[str, ...], float] = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.pool)):
+        if isinstance(pool, QueuePool):
+            state[(name, "checked_out")] = pool.checkedout()
+            state[(name, "idle")] = pool.checkedin()
+    return state
+
+
+if settings.METRICS_ENABLED:
+    metrics.instrument_engine(engine, "sync")
+    metrics.instrument_engine(async_engine.sync_engine, "async")
+    metrics.db_pool_connections.set_function(_pool_connections)
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 
-def get_db():
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
@@ -1,11 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 
+from app.assets.images import pipeline
+from app.assets.serving import UploadFiles
+from app.assets.storage import LocalStorage, storage
 from app.core.bootstrap import bootstrap_admin, BootstrapError
 from app.core.config import settings
-from app.db.session import SessionLocal
-from app.routers import auth_router, admin_users_router, assets_router, board_ws_router
+from app.core.deps import user_invalidations
+from app.core.metrics import MetricsMiddleware
+from app.core.refresh_tokens import sweeper
+from app.core.security import PasswordPoolBusy
+from app.core.versions import versions
+from app.db.session import SessionLocal, async_engine
+from app.routers import auth_router, admin_users_router, assets_router, board_ws_router, metrics_router
+from app.routers.board_ws import rooms, sessions
 
 
 def create_app() -> FastAPI:
@@ -25,14 +34,35 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    if settings.METRICS_ENABLED:
+        # outermost, so latency covers CORS and error handling too
+        app.add_middleware(MetricsMiddleware)
+
+    @app.exception_handler(PasswordPoolBusy)
+    async def _password_pool_busy(_: Request, __: PasswordPoolBusy):
+        # shed load instead of queueing more bcrypt work
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server busy, try again"},
+            headers={"Retry-After": "1"},
+        )
+
     # API under /api
     app.include_router(auth_router, prefix="/api")
     app.include_router(admin_users_router, prefix="/api")
     app.include_router(assets_router, prefix="/api")
     app.include_router(board_ws_router, prefix="/api")
+    if settings.METRICS_ENABLED:
+        app.include_router(metrics_router, prefix="/api")
 
-    # Serve local uploads
-    app.mount("/storage", StaticFiles(directory="storage"), name="storage")
+    # Serve local uploads; remote backends hand out their own URLs
+    if isinstance(storage, LocalStorage):
+        storage.root.mkdir(parents=True, exist_ok=True)
+        app.mount(
+            "/storage/uploads",
+            UploadFiles(storage.root, accel_redirect_prefix=settings.STORAGE_ACCEL_REDIRECT_PREFIX),
+            name="storage",
+        )
 
     @app.on_event("startup")
     def _startup():
@@ -45,6 +75,42 @@ def create_app() -> FastAPI:
         finally:
             db.close()
 
+    @app.on_event("startup")
+    async def _start_board_rooms():
+        # listing versions and user evictions share the board event channel between workers
+        versions.attach(rooms.backend)
+        user_invalidations.attach(rooms.backend)
+        await rooms.start()
+        await versions.seed()
+
+    @app.on_event("startup")
+    async def _start_board_session_revalidator():
+        sessions.start()
+
+    @app.on_event("startup")
+    async def _start_refresh_token_sweeper():
+        sweeper.start()
+
+    @app.on_event("shutdown")
+    async def _stop_refresh_token_sweeper():
+        await sweeper.stop()
+
+    @app.on_event("shutdown")
+    async def _stop_board_session_revalidator():
+        await sessions.stop()
+
+    @app.on_event("shutdown")
+    async def _stop_board_rooms():
+        await rooms.stop()
+
+    @app.on_event("shutdown")
+    async def _drain_image_pipeline():
+        await pipeline.stop()
+
+    @app.on_event("shutdown")
+    async def _dispose_async_engine():
+        await async_engine.dispose()
+
     return app
 
 
@@ -2,3 +2,4 @@ from .auth import router as auth_router
 from .admin_users import router as admin_users_router
 from .assets import router as assets_router
 from .board_ws import router as board_ws_router
+from .metrics import router as metrics_router
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.deps import require_role
-from app.core.security import hash_password, normalize_nickname, validate_nickname
+from app.core.deps import invalidate_user, require_role
+from app.core.security import hash_password_async, normalize_nickname, validate_nickname
+from app.core.versions import USERS, cached_json, versions
 from app.db.session import get_db
 from app.db.models.user import User
 from app.schemas.user import UsersListOut, UserOut, UserCreateIn, UserPatchIn
@@ -13,30 +15,34 @@ router = APIRouter(prefix="/admin/users", tags=["admin-users"])
 
 
 @router.get("", response_model=UsersListOut)
-def list_users(
-    db: Session = Depends(get_db),
+async def list_users(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     _: User = Depends(require_role("ADMIN")),
-):
-    items = db.query(User).order_by(User.created_at.desc()).all()
-    return {"items": items}
+) -> Response:
+    async def build() -> str:
+        items = (await db.scalars(select(User).order_by(User.created_at.desc()))).all()
+        return UsersListOut.model_validate({"items": items}, from_attributes=True).model_dump_json(by_alias=True)
+
+    return await cached_json(request, USERS, build)
 
 
 @router.get("/{user_id}", response_model=UserOut)
-def get_user(
+async def get_user(
     user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: User = Depends(require_role("ADMIN")),
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
 @router.post("", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def create_user(
+async def create_user(
     data: UserCreateIn,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: User = Depends(require_role("ADMIN")),
 ):
     try:
@@ -45,31 +51,32 @@ def create_user(
         raise HTTPException(status_code=422, detail="Nickname cannot be empty")
 
     nickname_norm = normalize_nickname(data.nickname)
-    exists = db.query(User).filter(User.nickname_norm == nickname_norm).first()
+    exists = await db.scalar(select(User.id).where(User.nickname_norm == nickname_norm))
     if exists:
         raise HTTPException(status_code=409, detail="Nickname already exists")
 
     user = User(
         nickname=data.nickname,
         nickname_norm=nickname_norm,
-        password_hash=hash_password(data.password),
+        password_hash=await hash_password_async(data.password),
         role="USER",  # ADMIN só cria USER
         is_active=True,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await versions.bump(USERS)
+    await db.refresh(user)
     return user
 
 
 @router.patch("/{user_id}", response_model=UserOut)
-def patch_user(
+async def patch_user(
     user_id: str,
     data: UserPatchIn,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _: User = Depends(require_role("ADMIN")),
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -80,10 +87,8 @@ def patch_user(
             raise HTTPException(status_code=422, detail="Nickname cannot be empty")
 
         nickname_norm = normalize_nickname(data.nickname)
-        exists = (
-            db.query(User)
-            .filter(User.nickname_norm == nickname_norm, User.id != user.id)
-            .first()
+        exists = await db.scalar(
+            select(User.id).where(User.nickname_norm == nickname_norm, User.id != user.id)
         )
         if exists:
             raise HTTPException(status_code=409, detail="Nickname already exists")
@@ -91,11 +96,13 @@ def patch_user(
         user.nickname_norm = nickname_norm
 
     if data.password is not None:
-        user.password_hash = hash_password(data.password)
+        user.password_hash = await hash_password_async(data.password)
 
     if data.isActive is not None:
         user.is_active = data.isActive
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await invalidate_user(user.id)
+    await versions.bump(USERS)
+    await db.refresh(user)
     return user
@@ -1,81 +1,267 @@
 from __future__ import annotations
 
-from pathlib import Path
+import base64
+from datetime import datetime, timedelta, timezone
+import json
+import re
 import uuid
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from jose import JWTError, jwt
+from sqlalchemy import literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
+from app.assets.blobs import TMP_DIR, acquire_blob, find_blob, storage_key
+from app.assets.images import cells, pipeline
+from app.assets.storage import storage
+from app.assets.uploads import ALLOWED_MIME, receive_upload
+from app.core.config import settings
 from app.core.deps import require_role
+from app.core.ratelimit import limit_by_user
+from app.core.security import ALGORITHM
+from app.core.versions import ASSETS, cached_json, versions
 from app.db.session import get_db
-from app.db.models.asset import Asset
+from app.db.models.asset import Asset, AssetBlob
 from app.db.models.user import User
-from app.schemas.asset import AssetsListOut, AssetOut
+from app.schemas.asset import (
+    AssetsListOut,
+    AssetOut,
+    DirectUploadCompleteIn,
+    DirectUploadIn,
+    DirectUploadOut,
+)
 
 router = APIRouter(prefix="/assets", tags=["assets"])
 
-ALLOWED_MIME = {"image/png", "image/jpeg", "image/webp"}
-UPLOAD_DIR = Path("storage/uploads")
+# one bucket per user for both ways of starting an upload
+limit_uploads = limit_by_user("upload", settings.RATE_LIMIT_UPLOADS_PER_MINUTE)
+
+EXT_MAP = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp"}
+ASSET_TYPES = ("MAP", "AVATAR")
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+# audience of direct upload tickets; access token checks reject any "aud"
+UPLOAD_TICKET_AUDIENCE = "asset-upload"
+
+# the route reads the body itself, so the form is described by hand for the docs
+UPLOAD_FORM_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["type", "name", "file"],
+                    "properties": {
+                        "type": {"type": "string", "enum": list(ASSET_TYPES)},
+                        "name": {"type": "string"},
+                        "file": {"type": "string", "format": "binary"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+# Opaque keyset cursor: the (created_at, id) of the last item on the page.
+def encode_cursor(created_at: datetime, asset_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), asset_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, asset_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(asset_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="Invalid cursor")
 
 
 @router.get("", response_model=AssetsListOut)
-def list_assets(
-    db: Session = Depends(get_db),
+async def list_assets(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    type: str | None = None,  # MAP | AVATAR
+    uploaded_by: str | None = Query(None, alias="uploadedBy"),
+    db: AsyncSession = Depends(get_db),
     _: User = Depends(require_role("USER", "ADMIN")),
-):
-    items = db.query(Asset).order_by(Asset.created_at.desc()).all()
-    return {"items": items}
+) -> Response:
+    stmt = select(Asset)
+    if type is not None:
+        if type not in ASSET_TYPES:
+            raise HTTPException(status_code=422, detail="Invalid type. Use MAP or AVATAR.")
+        stmt = stmt.where(Asset.type == type)
+    if uploaded_by is not None:
+        stmt = stmt.where(Asset.uploaded_by_user_id == uploaded_by)
+    if cursor:
+        created_at, asset_id = decode_cursor(cursor)
+        bound = tuple_(literal(created_at, Asset.created_at.type), literal(asset_id, Asset.id.type))
+        stmt = stmt.where(tuple_(Asset.created_at, Asset.id) < bound)
 
+    # one extra row tells us whether another page exists
+    stmt = stmt.order_by(Asset.created_at.desc(), Asset.id.desc()).limit(limit + 1)
 
-@router.post("/upload", response_model=AssetOut, status_code=status.HTTP_201_CREATED)
-def upload_asset(
-    type: str = Form(...),  # MAP | AVATAR
-    name: str = Form(...),
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_role("USER")),
-):
-    if type not in ("MAP", "AVATAR"):
+    async def build() -> str:
+        items = (await db.scalars(stmt)).all()
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+        out = AssetsListOut.model_validate({"items": items, "nextCursor": next_cursor}, from_attributes=True)
+        return out.model_dump_json(by_alias=True)
+
+    return await cached_json(request, ASSETS, build)
+
+
+# fields that arrived ahead of the file; missing ones are checked at the end
+def _check_fields(fields: dict[str, str]) -> None:
+    if "type" in fields and fields["type"] not in ASSET_TYPES:
+        raise HTTPException(status_code=422, detail="Invalid type. Use MAP or AVATAR.")
+    if "name" in fields and not fields["name"].strip():
+        raise HTTPException(status_code=422, detail="Name cannot be empty")
+
+
+def _validate_upload(type: str, name: str, content_type: str | None) -> str:
+    if type not in ASSET_TYPES:
         raise HTTPException(status_code=422, detail="Invalid type. Use MAP or AVATAR.")
 
     if not name.strip():
         raise HTTPException(status_code=422, detail="Name cannot be empty")
 
-    if file.content_type not in ALLOWED_MIME:
+    if content_type not in ALLOWED_MIME:
         raise HTTPException(
             status_code=415,
-            detail=f"Unsupported media type: {file.content_type}. Allowed: png, jpeg, webp.",
+            detail=f"Unsupported media type: {content_type}. Allowed: png, jpeg, webp.",
         )
+    return EXT_MAP[content_type]
 
-    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
-    ext_map = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp"}
-    ext = ext_map[file.content_type]
-
-    asset_id = str(uuid.uuid4())
-    storage_name = f"{asset_id}{ext}"
-    dst_path = UPLOAD_DIR / storage_name
-
-    with dst_path.open("wb") as out:
-        while True:
-            chunk = file.file.read(1024 * 1024)
-            if not chunk:
-                break
-            out.write(chunk)
-
-    file_url = f"/storage/uploads/{storage_name}"
 
+async def _create_asset(db: AsyncSession, blob: AssetBlob, type: str, name: str, user_id: str) -> Asset:
+    width_cells, height_cells = cells(blob.width, blob.height)
     asset = Asset(
-        id=asset_id,
         type=type,
         name=name,
-        file_url=file_url,
-        uploaded_by_user_id=current_user.id,
-        width_cells=None,
-        height_cells=None,
+        file_url=storage.url(blob.storage_key),
+        blob_digest=blob.digest,
+        uploaded_by_user_id=user_id,
+        width_cells=width_cells,
+        height_cells=height_cells,
     )
     db.add(asset)
-    db.commit()
-    db.refresh(asset)
+    await db.commit()
+    await versions.bump(ASSETS)
+    await db.refresh(asset)
 
+    if blob.variants is None:
+        # dimensions and variants are filled in after the response, once per content
+        pipeline.submit(blob.digest, blob.storage_key)
     return asset
+
+
+@router.post(
+    "/upload",
+    response_model=AssetOut,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=UPLOAD_FORM_OPENAPI,
+    dependencies=[Depends(limit_uploads)],
+)
+async def upload_asset(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("USER")),
+):
+    # the multipart body is parsed here, as it arrives, instead of being spooled
+    # by the framework first
+    tmp_path = TMP_DIR / uuid.uuid4().hex
+    try:
+        upload = await receive_upload(request, tmp_path, settings.ASSET_MAX_BYTES, check_fields=_check_fields)
+        type, name = upload.fields.get("type", ""), upload.fields.get("name", "")
+        ext = _validate_upload(type, name, upload.content_type)
+        blob, _ = await acquire_blob(db, upload.digest, storage_key(upload.digest, ext), upload.content_type, upload.size)
+        await run_in_threadpool(storage.save, tmp_path, blob.storage_key, blob.content_type)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    return await _create_asset(db, blob, type, name, current_user.id)
+
+
+# Direct upload, step 1: the client announces the file by hash. Known content
+# becomes an asset right away; otherwise the client gets a presigned PUT and a
+# signed ticket describing what it promised to upload.
+@router.post(
+    "/uploads",
+    response_model=DirectUploadOut,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(limit_uploads)],
+)
+async def start_direct_upload(
+    data: DirectUploadIn,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("USER")),
+):
+    ext = _validate_upload(data.type, data.name, data.content_type)
+    digest = data.sha256.lower()
+    if not SHA256_RE.match(digest) or data.size <= 0:
+        raise HTTPException(status_code=422, detail="Invalid sha256 or size")
+    if data.size > settings.ASSET_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"File too large (max {settings.ASSET_MAX_BYTES} bytes)")
+
+    blob = await find_blob(db, digest)
+    if blob is not None:
+        asset = await _create_asset(db, blob, data.type, data.name, current_user.id)
+        return {"asset": asset}
+
+    key = storage_key(digest, ext)
+    checksum = base64.b64encode(bytes.fromhex(digest)).decode("ascii")
+    upload = storage.presign_upload(key, data.content_type, data.size, checksum)
+    if upload is None:
+        # the client falls back to POST /assets/upload
+        raise HTTPException(status_code=501, detail="Direct uploads are not enabled")
+
+    ticket = jwt.encode(
+        {
+            "typ": "upload",
+            "aud": UPLOAD_TICKET_AUDIENCE,
+            "sub": current_user.id,
+            "sha256": digest,
+            "key": key,
+            "type": data.type,
+            "name": data.name,
+            "contentType": data.content_type,
+            "size": data.size,
+            "exp": datetime.now(timezone.utc) + timedelta(seconds=settings.UPLOAD_PRESIGN_SECONDS),
+        },
+        settings.JWT_SECRET,
+        algorithm=ALGORITHM,
+    )
+    response.status_code = status.HTTP_200_OK
+    return {"upload": {**upload, "ticket": ticket}}
+
+
+# Direct upload, step 2: the object is in storage; record it.
+@router.post("/uploads/complete", response_model=AssetOut, status_code=status.HTTP_201_CREATED)
+async def complete_direct_upload(
+    data: DirectUploadCompleteIn,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_role("USER")),
+):
+    try:
+        claims = jwt.decode(
+            data.ticket, settings.JWT_SECRET, algorithms=[ALGORITHM], audience=UPLOAD_TICKET_AUDIENCE
+        )
+    except JWTError:
+        raise HTTPException(status_code=422, detail="Invalid or expired upload ticket")
+    if claims.get("typ") != "upload" or claims.get("sub") != current_user.id:
+        raise HTTPException(status_code=422, detail="Invalid or expired upload ticket")
+
+    digest, key, size = claims["sha256"], claims["key"], claims["size"]
+    checksum = base64.b64encode(bytes.fromhex(digest)).decode("ascii")
+    if not await run_in_threadpool(storage.verify_upload, key, size, checksum):
+        raise HTTPException(status_code=409, detail="Upload not found or incomplete")
+
+    blob, _ = await acquire_blob(db, digest, key, claims["contentType"], size)
+    return await _create_asset(db, blob, claims["type"], claims["name"], current_user.id)
@@ -2,13 +2,13 @@ from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, HTTPException, Response, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.security import (
-    verify_password,
+    verify_and_update_password_async,
     create_access_token,
-    create_refresh_token_raw,
     hash_refresh_token,
     normalize_nickname,
     validate_nickname,
@@ -18,25 +18,55 @@ from app.db.models.user import User
 from app.db.models.refresh_token import RefreshToken
 from app.schemas.auth import LoginIn, LoginOut, RefreshOut, MeOut, LoginUserOut
 from app.core.deps import get_current_user
+from app.core.ratelimit import limit_by_ip, per_minute
+from app.core.refresh_tokens import (
+    coalescer,
+    mark_rotated,
+    new_refresh_token,
+    rejected_hashes,
+    revoke_family,
+)
+from app.core.versions import USERS, versions
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 COOKIE_NAME = "refresh_token"
 
 
-@router.post("/login", response_model=LoginOut)
-def login(data: LoginIn, response: Response, db: Session = Depends(get_db)):
+def _set_refresh_cookie(response: Response, raw: str) -> None:
+    response.set_cookie(
+        key=COOKIE_NAME,
+        value=raw,
+        httponly=True,
+        secure=settings.COOKIE_SECURE,
+        samesite="lax",
+        path="/",
+        max_age=int(settings.REFRESH_DAYS * 24 * 3600),
+    )
+
+
+@router.post(
+    "/login",
+    response_model=LoginOut,
+    # every attempt costs a bcrypt verification
+    dependencies=[Depends(limit_by_ip("login", per_minute(settings.RATE_LIMIT_LOGIN_PER_MINUTE)))],
+)
+async def login(data: LoginIn, response: Response, db: AsyncSession = Depends(get_db)):
     try:
         validate_nickname(data.nickname)
     except ValueError:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     nickname_norm = normalize_nickname(data.nickname)
-    user = db.query(User).filter(User.nickname_norm == nickname_norm).first()
+    user = await db.scalar(select(User).where(User.nickname_norm == nickname_norm))
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(data.password, user.password_hash):
+    valid, new_hash = await verify_and_update_password_async(data.password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # stored hash used an outdated bcrypt cost
+        user.password_hash = new_hash
 
     access = create_access_token(
         subject=str(user.id),
@@ -45,24 +75,14 @@ def login(data: LoginIn, response: Response, db: Session = Depends(get_db)):
         minutes=settings.ACCESS_MINUTES,
     )
 
-    refresh_raw = create_refresh_token_raw()
-    rt = RefreshToken(
-        user_id=user.id,
-        token_hash=hash_refresh_token(refresh_raw),
-        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_DAYS),
-    )
+    refresh_raw, rt = new_refresh_token(user.id)
     db.add(rt)
-    db.commit()
+    await db.commit()
+    if new_hash:
+        # the rehash touched updated_at, which the admin listing shows
+        await versions.bump(USERS)
 
-    response.set_cookie(
-        key=COOKIE_NAME,
-        value=refresh_raw,
-        httponly=True,
-        secure=settings.COOKIE_SECURE,
-        samesite="lax",
-        path="/",
-        max_age=int(settings.REFRESH_DAYS * 24 * 3600),
-    )
+    _set_refresh_cookie(response, refresh_raw)
 
     return LoginOut(
         accessToken=access,
@@ -70,52 +90,106 @@ def login(data: LoginIn, response: Response, db: Session = Depends(get_db)):
     )
 
 
-@router.post("/refresh", response_model=RefreshOut)
-def refresh(request: Request, db: Session = Depends(get_db)):
+def _reject(token_hash: str, detail: str) -> HTTPException:
+    # the cookie can never succeed again; answer repeats without the database
+    rejected_hashes.set(token_hash, detail)
+    return HTTPException(status_code=401, detail=detail)
+
+
+async def _refresh_access(db: AsyncSession, token_hash: str, response: Response) -> str:
+    now = datetime.now(timezone.utc)
+    grace = timedelta(seconds=settings.REFRESH_REUSE_GRACE_SECONDS)
+    # token and user in one round trip; time comparisons happen in SQL, where
+    # stored and current times agree on the zone
+    row = (
+        await db.execute(
+            select(
+                RefreshToken,
+                User.role,
+                User.is_active,
+                RefreshToken.expires_at > now,
+                RefreshToken.revoked_at > now - grace,
+            )
+            .join(User, User.id == RefreshToken.user_id)
+            .where(RefreshToken.token_hash == token_hash)
+        )
+    ).first()
+    if row is None:
+        raise _reject(token_hash, "Refresh expired")
+    rt, role, is_active, live, just_rotated = row
+
+    rotate = True
+    if rt.revoked_at is not None:
+        if rt.replaced_by_id is None:
+            # logged out or revoked with its family
+            raise _reject(token_hash, "Refresh expired")
+        if not just_rotated:
+            # a rotated-out token came back: someone else holds a copy, end the whole login
+            await revoke_family(db, rt.family_id, now)
+            await db.commit()
+            raise _reject(token_hash, "Refresh token reused")
+        # another request with the same cookie rotated it a moment ago; its
+        # response carries the new cookie, so only mint an access token
+        rotate = False
+    elif not live:
+        raise _reject(token_hash, "Refresh expired")
+
+    if not is_active:
+        raise HTTPException(status_code=401, detail="User inactive")
+
+    if rotate:
+        refresh_raw, new_rt = new_refresh_token(rt.user_id, family_id=rt.family_id)
+        if await mark_rotated(db, rt, new_rt.id, now):
+            db.add(new_rt)
+            await db.commit()
+            _set_refresh_cookie(response, refresh_raw)
+
+    return create_access_token(
+        subject=str(rt.user_id),
+        role=role,
+        secret=settings.JWT_SECRET,
+        minutes=settings.ACCESS_MINUTES,
+    )
+
+
+@router.post(
+    "/refresh",
+    response_model=RefreshOut,
+    dependencies=[Depends(limit_by_ip("refresh", per_minute(settings.RATE_LIMIT_REFRESH_PER_MINUTE)))],
+)
+async def refresh(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     raw = request.cookies.get(COOKIE_NAME)
     if not raw:
         raise HTTPException(status_code=401, detail="No refresh token")
 
     token_hash = hash_refresh_token(raw)
-    rt = (
-        db.query(RefreshToken)
-        .filter(RefreshToken.token_hash == token_hash, RefreshToken.revoked_at.is_(None))
-        .first()
-    )
-    if not rt or rt.expires_at < datetime.now(timezone.utc):
-        raise HTTPException(status_code=401, detail="Refresh expired")
+    detail = rejected_hashes.get(token_hash)
+    if detail is not None:
+        raise HTTPException(status_code=401, detail=detail)
 
-    user = db.query(User).filter(User.id == rt.user_id).first()
-    if not user or not user.is_active:
-        raise HTTPException(status_code=401, detail="User inactive")
-
-    access = create_access_token(
-        subject=str(user.id),
-        role=user.role,
-        secret=settings.JWT_SECRET,
-        minutes=settings.ACCESS_MINUTES,
-    )
+    # only the request that does the work sets the rotated cookie
+    access = await coalescer.run(token_hash, lambda: _refresh_access(db, token_hash, response))
     return RefreshOut(accessToken=access)
 
 
 @router.get("/me", response_model=MeOut)
-def me(user: User = Depends(get_current_user)):
+async def me(user: User = Depends(get_current_user)):
     return MeOut(id=user.id, nickname=user.nickname, role=user.role)
 
 
 @router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
-def logout(response: Response, request: Request, db: Session = Depends(get_db)):
+async def logout(response: Response, request: Request, db: AsyncSession = Depends(get_db)):
     raw = request.cookies.get(COOKIE_NAME)
     if raw:
         token_hash = hash_refresh_token(raw)
-        rt = (
-            db.query(RefreshToken)
-            .filter(RefreshToken.token_hash == token_hash, RefreshToken.revoked_at.is_(None))
-            .first()
+        rt = await db.scalar(
+            select(RefreshToken).where(RefreshToken.token_hash == token_hash, RefreshToken.revoked_at.is_(None))
         )
         if rt:
             rt.revoked_at = datetime.now(timezone.utc)
-            db.commit()
+            await db.commit()
+        coalescer.forget(token_hash)
+        rejected_hashes.set(token_hash, "Refresh expired")
 
     response.delete_cookie(key=COOKIE_NAME, path="/")
     return Response(status_code=204)
@@ -1,66 +1,184 @@
 from __future__ import annotations
 
-from typing import Any
+import time
+import uuid
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from jose import JWTError, jwt
 
+from app.board.backends import create_backend
+from app.board.codec import decode, encode, negotiate
+from app.board.connection import BoardConnection, Frame, send_encoded
+from app.board.persistence import BoardPersister
+from app.board.rooms import DEFAULT_ROOM, BoardRoom, RoomRegistry, is_valid_room_id
+from app.board.sessions import BOARD_ROLES, SessionRevalidator
+from app.core import metrics
 from app.core.config import settings
-from app.core.security import ALGORITHM
+from app.core.deps import load_user_status, verify_access_token
+from app.core.ratelimit import local_store, per_second, role_budget
+from app.db.session import AsyncSessionLocal, SessionLocal
 
 router = APIRouter()
 
-connections: set[WebSocket] = set()
-board_state: dict[str, Any] = {
-    "selectedMapId": "",
-    "placedAvatars": [],
-    "mapViews": {},
-}
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_MESSAGE_TOO_BIG = 1009
+# an over-budget run ends once the client has stayed within budget this long
+THROTTLE_QUIET_SECONDS = 1.0
 
+rooms = RoomRegistry(
+    create_backend(settings.BOARD_BACKEND, settings.DATABASE_URL),
+    idle_seconds=settings.BOARD_ROOM_IDLE_SECONDS,
+    max_avatars=settings.BOARD_MAX_AVATARS,
+    tick_seconds=1 / settings.BOARD_TICK_HZ if settings.BOARD_TICK_HZ > 0 else 0.0,
+    history_size=settings.BOARD_HISTORY_SIZE,
+    persister=BoardPersister(
+        SessionLocal,
+        flush_interval_seconds=settings.BOARD_FLUSH_INTERVAL_SECONDS,
+        flush_max_ops=settings.BOARD_FLUSH_MAX_OPS,
+        snapshot_every=settings.BOARD_SNAPSHOT_EVERY,
+    )
+    if settings.BOARD_PERSIST_ENABLED
+    else None,
+)
+
+
+def _queue_depths() -> dict[tuple[str, ...], float]:
+    depths = [conn.queue_depth for conn in rooms.connections()]
+    return {("max",): max(depths, default=0), ("total",): sum(depths)}
 
-def _decode_token(token: str) -> dict[str, Any] | None:
-    try:
-        return jwt.decode(token, settings.JWT_SECRET, algorithms=[ALGORITHM])
-    except JWTError:
-        return None
 
+metrics.board_connections.set_function(lambda: len(rooms.connections()))
+metrics.board_rooms.set_function(lambda: len(rooms))
+metrics.board_send_queue_frames.set_function(_queue_depths)
 
-async def _broadcast(message: dict[str, Any]) -> None:
-    dead: list[WebSocket] = []
-    for ws in connections:
-        try:
-            await ws.send_json(message)
-        except RuntimeError:
-            dead.append(ws)
-    for ws in dead:
-        connections.discard(ws)
+sessions = SessionRevalidator(
+    rooms.connections,
+    AsyncSessionLocal,
+    interval_seconds=settings.BOARD_REVALIDATE_SECONDS,
+)
+
+
+def _catch_up(room: BoardRoom, since: str | None) -> list[Frame] | None:
+    # a reconnecting client passes the last revision it saw and gets only the
+    # patches it missed; None means it needs a snapshot
+    try:
+        rev = int(since) if since is not None else None
+    except ValueError:
+        return None
+    if rev is None or rev < 0:
+        return None
+    frames = room.frames_since(rev)
+    if frames is not None and len(frames) > settings.BOARD_SEND_QUEUE_MAX:
+        # would collapse to a snapshot in the queue anyway
+        return None
+    return frames
 
 
 @router.websocket("/ws/board")
-async def board_ws(websocket: WebSocket) -> None:
+@router.websocket("/ws/board/{room_id}")
+async def board_ws(websocket: WebSocket, room_id: str = DEFAULT_ROOM) -> None:
     token = websocket.query_params.get("token")
-    if not token:
-        await websocket.close(code=1008)
+    if not token or not is_valid_room_id(room_id):
+        await websocket.close(code=CLOSE_POLICY_VIOLATION)
         return
 
-    payload = _decode_token(token)
-    if not payload or payload.get("role") not in {"USER", "ADMIN"}:
-        await websocket.close(code=1008)
+    payload = verify_access_token(token)
+    if not payload or payload.get("role") not in BOARD_ROLES:
+        await websocket.close(code=CLOSE_POLICY_VIOLATION)
         return
+    status = await load_user_status(payload["sub"], payload.get("exp"))
+    if not status or not status[1]:
+        await websocket.close(code=CLOSE_POLICY_VIOLATION)
+        return
+
+    # per user, so opening more sockets doesn't buy more messages
+    limit_key = f"ws:user:{payload['sub']}"
+    budget = role_budget(settings.RATE_LIMIT_WS_MESSAGES_PER_SECOND, payload["role"], unit=per_second)
+    # current run of dropped messages: when it started, the last drop, how many
+    throttled_since = last_drop = 0.0
+    dropped = 0
 
-    await websocket.accept()
-    connections.add(websocket)
-    await websocket.send_json({"type": "state", "payload": board_state})
+    encoding, subprotocol = negotiate(
+        websocket.scope.get("subprotocols") or [], websocket.query_params.get("encoding")
+    )
+
+    client_id = uuid.uuid4().hex
+    await websocket.accept(subprotocol=subprotocol)
+    metrics.board_connections_opened.inc()
+    hello = {"type": "hello", "clientId": client_id, "roomId": room_id, "encoding": encoding}
+    await send_encoded(websocket, encode(hello, encoding))
+
+    room = await rooms.open(room_id)
+    conn = BoardConnection(
+        websocket,
+        client_id,
+        encoding,
+        snapshot=room.snapshot_frame,
+        max_queue=settings.BOARD_SEND_QUEUE_MAX,
+        max_lag_seconds=settings.BOARD_SLOW_CONSUMER_SECONDS,
+        user_id=payload["sub"],
+        expires_at=payload.get("exp"),
+    )
+    conn.start()
+    frames = _catch_up(room, websocket.query_params.get("since"))
+    if frames is None:
+        conn.request_snapshot()
+    else:
+        for frame in frames:
+            conn.send(frame)
+    room.join(conn)
 
     try:
-        while True:
-            message = await websocket.receive_json()
-            if message.get("type") != "state":
+        while not conn.closed:
+            event = await websocket.receive()
+            if event["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(event.get("code", 1000))
+            raw = event["bytes"] if event.get("bytes") is not None else event.get("text") or ""
+            limit = settings.BOARD_MAX_MESSAGE_BYTES
+            if len(raw) > limit or (isinstance(raw, str) and len(raw.encode("utf-8")) > limit):
+                await websocket.close(code=CLOSE_MESSAGE_TOO_BIG)
+                break
+            try:
+                message = decode(raw)
+            except ValueError:
                 continue
-            payload = message.get("payload") or {}
-            board_state["selectedMapId"] = payload.get("selectedMapId") or ""
-            board_state["placedAvatars"] = payload.get("placedAvatars") or []
-            board_state["mapViews"] = payload.get("mapViews") or {}
-            await _broadcast({"type": "state", "payload": board_state})
+            if not isinstance(message, dict):
+                continue
+            if settings.RATE_LIMIT_ENABLED:
+                now = time.monotonic()
+                if local_store.take_now(limit_key, budget) > 0:
+                    if not dropped:
+                        # one snapshot per run puts the client back on the shared state,
+                        # so flooding can't turn every dropped message into one
+                        throttled_since = now
+                        conn.request_snapshot()
+                    elif now - throttled_since > settings.RATE_LIMIT_WS_CLOSE_SECONDS:
+                        await websocket.close(code=CLOSE_POLICY_VIOLATION)
+                        break
+                    dropped += 1
+                    last_drop = now
+                    continue
+                if dropped and now - last_drop > THROTTLE_QUIET_SECONDS:
+                    if dropped > 1:
+                        # writes dropped after the first snapshot went out
+                        conn.request_snapshot()
+                    dropped = 0
+            kind = message.get("type")
+
+            if kind == "ops":
+                ops = message.get("ops")
+                if isinstance(ops, list) and ops:
+                    if not await rooms.submit_ops(room_id, ops, origin=client_id):
+                        # the write was lost; put the client back on the shared state
+                        conn.request_snapshot()
+            elif kind == "sync":
+                # client noticed a gap in revisions and asks for a fresh snapshot
+                conn.request_snapshot()
+            elif kind == "state":
+                # legacy full-state write
+                if not await rooms.submit_replace(room_id, message.get("payload") or {}):
+                    conn.request_snapshot()
     except WebSocketDisconnect:
-        connections.discard(websocket)
+        pass
+    finally:
+        room.leave(conn)
+        await conn.stop()
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import secrets
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app.core import metrics
+from app.core.config import settings
+
+router = APIRouter(tags=["metrics"])
+
+
+# async on purpose: the board gauges read event-loop state
+@router.get("/metrics", include_in_schema=False)
+async def scrape(request: Request) -> Response:
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not secrets.compare_digest(request.headers.get("authorization", ""), expected):
+            raise HTTPException(status_code=401, detail="Not authenticated")
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -2,12 +2,22 @@ from datetime import datetime
 from pydantic import BaseModel, Field
 
 
+class AssetVariantOut(BaseModel):
+    width: int
+    height: int
+    url: str
+
+
 class AssetOut(BaseModel):
     id: str
     type: str
     name: str
     file_url: str = Field(alias="fileUrl")
+    thumb_url: str = Field(alias="thumbUrl")
     uploaded_by_user_id: str | None = Field(alias="uploadedByUserId")
+    width_cells: int | None = Field(default=None, alias="widthCells")
+    height_cells: int | None = Field(default=None, alias="heightCells")
+    variants: list[AssetVariantOut] | None = None
     created_at: datetime | None = Field(default=None, alias="createdAt")
 
     class Config:
@@ -16,3 +26,35 @@ class AssetOut(BaseModel):
 
 class AssetsListOut(BaseModel):
     items: list[AssetOut]
+    next_cursor: str | None = Field(default=None, alias="nextCursor")
+
+    class Config:
+        populate_by_name = True
+
+
+class DirectUploadIn(BaseModel):
+    type: str
+    name: str
+    content_type: str = Field(alias="contentType")
+    size: int
+    sha256: str  # hex digest of the file, computed by the client
+
+    class Config:
+        populate_by_name = True
+
+
+class PresignedUploadOut(BaseModel):
+    method: str
+    url: str
+    headers: dict[str, str]
+    ticket: str  # sent back to /complete once the PUT succeeded
+
+
+class DirectUploadOut(BaseModel):
+    # set when the server already had these bytes and no upload is needed
+    asset: AssetOut | None = None
+    upload: PresignedUploadOut | None = None
+
+
+class DirectUploadCompleteIn(BaseModel):
+    ticket: str
@@ -0,0 +1,113 @@
+"""Pieces shared by the bench scripts: a uvicorn subprocess, a closed-loop load
+driver and one JSON shape for latency summaries."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from collections.abc import Awaitable, Callable
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(client, base: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(f"{base}/docs")
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict[str, Any]:
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    latencies = sorted(latencies)
+
+    def pct(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+# Runs `request(i)` for i in range(count) on `concurrency` workers, each
+# starting its next request as soon as the previous one answers. `request`
+# returns the HTTP status; anything but 2xx/304 counts as an error.
+async def drive(count: int, concurrency: int, request: Callable[[int], Awaitable[int]]) -> dict[str, Any]:
+    latencies: list[float] = []
+    statuses: Counter[int] = Counter()
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < count:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                status = await request(index)
+            except Exception:
+                status = 0  # transport error
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    errors = sum(n for status, n in statuses.items() if not (200 <= status < 300 or status == 304))
+    return {**summarize(latencies, elapsed, errors), "status": {str(k): v for k, v in sorted(statuses.items())}}
+
+
+# `python -m uvicorn target` as a child process; stopped on exit.
+class Server:
+    def __init__(
+        self,
+        target: str,
+        env: dict[str, str] | None = None,
+        cwd: str | None = None,
+        workers: int = 1,
+    ) -> None:
+        self.port = free_port()
+        self.base = f"http://127.0.0.1:{self.port}"
+        self._args = [sys.executable, "-m", "uvicorn", target, "--port", str(self.port), "--log-level", "warning"]
+        if workers > 1:
+            self._args += ["--workers", str(workers)]
+        self._env = {**os.environ, **(env or {})}
+        self._cwd = cwd
+        self._proc: subprocess.Popen[bytes] | None = None
+
+    def __enter__(self) -> Server:
+        self._proc = subprocess.Popen(self._args, env=self._env, cwd=self._cwd)
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        if self._proc is not None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+                self._proc.wait()
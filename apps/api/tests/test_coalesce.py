@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import random
+from typing import Any
+
+from app.board.coalesce import PatchBuffer
+from app.board.state import BoardState
+
+AVATAR_IDS = ("a", "b")
+ORIGINS = ("o1", "o2", "o3")
+
+
+def _seeded() -> BoardState:
+    state = BoardState(max_avatars=10)
+    for avatar_id in AVATAR_IDS:
+        state.apply({"op": "add", "avatar": {"id": avatar_id, "x": 1, "y": 1}})
+    return state
+
+
+# Applies `writes` ((origin, op) pairs) one by one on the server, then the
+# coalesced frame on a replica; both must end up with the same board.
+def _assert_frame_matches(writes: list[tuple[str, dict[str, Any]]]) -> None:
+    server, replica = _seeded(), _seeded()
+    buffer = PatchBuffer()
+    for origin, raw in writes:
+        applied = server.apply(raw)
+        if applied is not None:
+            buffer.add(server.rev, server.rev + 1, origin, [applied])
+            server.rev += 1
+    if buffer:
+        for op in buffer.frame().message["ops"]:
+            replica.apply(op)
+    assert replica.snapshot() == server.snapshot()
+
+
+def test_same_origin_update_does_not_jump_an_interleaved_move() -> None:
+    _assert_frame_matches(
+        [
+            ("o1", {"op": "update", "id": "a", "fields": {"x": 3, "hpCurrent": 5}}),
+            ("o2", {"op": "move", "id": "a", "x": 9, "y": 1}),
+            ("o1", {"op": "update", "id": "a", "fields": {"hpCurrent": 4}}),
+        ]
+    )
+
+
+def test_random_writes_coalesce_to_the_same_board() -> None:
+    rng = random.Random(21)
+
+    def random_op() -> dict[str, Any]:
+        avatar_id = rng.choice(AVATAR_IDS)
+        kind = rng.choice(("move", "update", "update", "add", "remove"))
+        if kind == "move":
+            return {"op": kind, "id": avatar_id, "x": rng.randint(0, 9), "y": rng.randint(0, 9)}
+        if kind == "update":
+            names = rng.sample(("x", "y", "name", "hpTotal", "hpCurrent"), rng.randint(1, 3))
+            fields = {name: (f"n{rng.randint(0, 9)}" if name == "name" else rng.randint(0, 9)) for name in names}
+            return {"op": kind, "id": avatar_id, "fields": fields}
+        if kind == "add":
+            return {"op": kind, "avatar": {"id": avatar_id, "x": rng.randint(0, 9), "y": rng.randint(0, 9)}}
+        return {"op": kind, "id": avatar_id}
+
+    for _ in range(2000):
+        _assert_frame_matches([(rng.choice(ORIGINS), random_op()) for _ in range(rng.randint(1, 8))])
@@ -1,15 +1,22 @@
 import { useEffect, useMemo, useRef, useState } from "react";
+import { decode, encode } from "@msgpack/msgpack";
 import { useAuth } from "@/app/providers/AuthProvider";
-import { getAccessToken, http } from "@/shared/api/http";
+import { getAccessToken, http, refreshAccessToken } from "@/shared/api/http";
 import { useTheme } from "@/shared/ui/useTheme";
 import { useAiSignature } from "@/shared/ui/useAiSignature";
 
+type AssetVariant = { width: number; height: number; url: string };
+
 type Asset = {
   id: string;
   type: "MAP" | "AVATAR";
   name: string;
   fileUrl: string;
+  thumbUrl: string;
   uploadedByUserId: string | null;
+  widthCells: number | null;
+  heightCells: number | null;
+  variants: AssetVariant[] | null;
   createdAt: string | null;
 };
 
@@ -31,14 +38,193 @@ type DragState = {
   offsetY: number;
 };
 
+type MapView = { scale: number; x: number; y: number };
+
+type BoardSnapshot = {
+  selectedMapId: string;
+  placedAvatars: PlacedAvatar[];
+  mapViews: Record<string, MapView>;
+};
+
+type BoardOp =
+  | { op: "add"; avatar: PlacedAvatar }
+  | { op: "move"; id: string; x: number; y: number }
+  | { op: "update"; id: string; fields: Partial<PlacedAvatar> }
+  | { op: "remove"; id: string }
+  | { op: "select_map"; mapId: string }
+  | { op: "set_view"; mapId: string; view: MapView };
+
+const EMPTY_BOARD: BoardSnapshot = { selectedMapId: "", placedAvatars: [], mapViews: {} };
+
+function normalizeAvatar(avatar: PlacedAvatar): PlacedAvatar {
+  return {
+    ...avatar,
+    size: avatar.size ?? 1,
+    hpTotal: avatar.hpTotal ?? 10,
+    hpCurrent: avatar.hpCurrent ?? avatar.hpTotal ?? 10,
+  };
+}
+
+// Builds the minimal list of ops that turns `prev` into `next`.
+function diffBoard(prev: BoardSnapshot, next: BoardSnapshot): BoardOp[] {
+  const ops: BoardOp[] = [];
+  if (prev.selectedMapId !== next.selectedMapId) {
+    ops.push({ op: "select_map", mapId: next.selectedMapId });
+  }
+
+  const prevById = new Map(prev.placedAvatars.map((avatar) => [avatar.id, avatar]));
+  const nextIds = new Set<string>();
+  for (const avatar of next.placedAvatars) {
+    nextIds.add(avatar.id);
+    const before = prevById.get(avatar.id);
+    if (!before) {
+      ops.push({ op: "add", avatar });
+      continue;
+    }
+    if (before === avatar) continue;
+    const fields: Partial<PlacedAvatar> = {};
+    let onlyPosition = true;
+    for (const key of Object.keys(avatar) as (keyof PlacedAvatar)[]) {
+      if (before[key] !== avatar[key]) {
+        (fields as Record<string, unknown>)[key] = avatar[key];
+        if (key !== "x" && key !== "y") onlyPosition = false;
+      }
+    }
+    if (Object.keys(fields).length === 0) continue;
+    if (onlyPosition) {
+      ops.push({ op: "move", id: avatar.id, x: avatar.x, y: avatar.y });
+    } else {
+      ops.push({ op: "update", id: avatar.id, fields });
+    }
+  }
+  for (const avatar of prev.placedAvatars) {
+    if (!nextIds.has(avatar.id)) {
+      ops.push({ op: "remove", id: avatar.id });
+    }
+  }
+
+  for (const [mapId, view] of Object.entries(next.mapViews)) {
+    const before = prev.mapViews[mapId];
+    if (!before || before.scale !== view.scale || before.x !== view.x || before.y !== view.y) {
+      ops.push({ op: "set_view", mapId, view });
+    }
+  }
+  return ops;
+}
+
+function applyBoardOps(board: BoardSnapshot, ops: BoardOp[]): BoardSnapshot {
+  let { selectedMapId, placedAvatars, mapViews } = board;
+  for (const op of ops) {
+    switch (op.op) {
+      case "select_map":
+        selectedMapId = op.mapId;
+        break;
+      case "set_view":
+        mapViews = { ...mapViews, [op.mapId]: op.view };
+        break;
+      case "add":
+        placedAvatars = [
+          ...placedAvatars.filter((avatar) => avatar.id !== op.avatar.id),
+          normalizeAvatar(op.avatar),
+        ];
+        break;
+      case "move":
+        placedAvatars = placedAvatars.map((avatar) =>
+          avatar.id === op.id ? { ...avatar, x: op.x, y: op.y } : avatar
+        );
+        break;
+      case "update":
+        placedAvatars = placedAvatars.map((avatar) =>
+          avatar.id === op.id ? { ...avatar, ...op.fields } : avatar
+        );
+        break;
+      case "remove":
+        placedAvatars = placedAvatars.filter((avatar) => avatar.id !== op.id);
+        break;
+    }
+  }
+  return { selectedMapId, placedAvatars, mapViews };
+}
+
+// smallest server-rendered variant that still covers `targetPx` on its longest edge
+function pickVariantUrl(asset: Asset, targetPx: number): string {
+  const px = targetPx * (window.devicePixelRatio || 1);
+  const match = asset.variants?.find((variant) => Math.max(variant.width, variant.height) >= px);
+  return match?.url ?? asset.fileUrl;
+}
+
+async function sha256Hex(file: File): Promise<string> {
+  const digest = await crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, "0")).join("");
+}
+
+// cleared after the first 501 so local-storage servers aren't asked again
+let directUploadsEnabled = true;
+
+// Uploads straight to storage with a presigned PUT. Returns null when the server
+// (or the browser) can't do it, and the caller falls back to the form upload.
+async function uploadDirect(file: File, type: string, name: string): Promise<Asset | null> {
+  if (!directUploadsEnabled || !window.crypto?.subtle) return null;
+  let start;
+  try {
+    start = await http.post("/assets/uploads", {
+      type,
+      name,
+      contentType: file.type,
+      size: file.size,
+      sha256: await sha256Hex(file),
+    });
+  } catch (err: any) {
+    if (err?.response?.status === 501) {
+      directUploadsEnabled = false;
+      return null;
+    }
+    throw err;
+  }
+  // the server already had these bytes
+  if (start.data.asset) return start.data.asset as Asset;
+
+  const { method, url, headers, ticket } = start.data.upload;
+  try {
+    const put = await fetch(url, { method, headers, body: file });
+    if (!put.ok) return null;
+  } catch {
+    return null;
+  }
+  const done = await http.post("/assets/uploads/complete", { ticket });
+  return done.data as Asset;
+}
+
+// offered on connect; the server picks the first one it knows and keeps JSON for older clients
+const BOARD_PROTOCOLS = ["board.msgpack", "board.json"];
+// close code the API uses when the socket's access token expired (see app/board/connection.py)
+const WS_CLOSE_SESSION_EXPIRED = 4001;
+// closes that reconnecting can't fix: auth/policy, oversized message, revoked session
+const WS_CLOSE_FINAL = new Set([1008, 1009, 4003]);
+const WS_RECONNECT_BASE_MS = 500;
+const WS_RECONNECT_MAX_MS = 15000;
+
+function sendBoardMessage(ws: WebSocket, message: unknown) {
+  ws.send(ws.protocol === "board.msgpack" ? encode(message) : JSON.stringify(message));
+}
+
+function decodeBoardMessage(data: unknown): any {
+  return typeof data === "string" ? JSON.parse(data) : decode(new Uint8Array(data as ArrayBuffer));
+}
+
 const GRID_SIZE = 40;
+const ASSETS_PAGE_SIZE = 100;
 export function DashboardPage() {
   const { me, logout } = useAuth();
   const { theme, setTheme } = useTheme();
   useAiSignature("Dashboard / Campo");
   const boardRef = useRef<HTMLDivElement | null>(null);
   const wsRef = useRef<WebSocket | null>(null);
-  const suppressNextSync = useRef(false);
+  // last board state known to the server; local edits are diffed against it
+  const syncedRef = useRef<BoardSnapshot>(EMPTY_BOARD);
+  const revRef = useRef(0);
+  const clientIdRef = useRef<string | null>(null);
+  const reconnectAttemptsRef = useRef(0);
   const [assets, setAssets] = useState<Asset[]>([]);
   const [type, setType] = useState<"MAP" | "AVATAR">("MAP");
   const [name, setName] = useState("");
@@ -53,13 +239,22 @@ export function DashboardPage() {
   const [isActionsOpen, setIsActionsOpen] = useState(false);
   const [editingAvatarId, setEditingAvatarId] = useState<string | null>(null);
   const [isMapAdjustOpen, setIsMapAdjustOpen] = useState(false);
-  const [mapViews, setMapViews] = useState<Record<string, { scale: number; x: number; y: number }>>({});
+  const [mapViews, setMapViews] = useState<Record<string, MapView>>({});
   const [isUploadAdjustOpen, setIsUploadAdjustOpen] = useState(false);
   const [pendingMapAdjust, setPendingMapAdjust] = useState<{ scale: number; x: number; y: number } | null>(null);
+  // bumped to reopen the board socket with a fresh token
+  const [wsEpoch, setWsEpoch] = useState(0);
 
   async function loadAssets() {
-    const res = await http.get("/assets");
-    setAssets(res.data.items as Asset[]);
+    // pages through the keyset cursor, rendering each page as it arrives
+    const items: Asset[] = [];
+    let cursor: string | null = null;
+    do {
+      const res = await http.get("/assets", { params: { limit: ASSETS_PAGE_SIZE, cursor: cursor ?? undefined } });
+      items.push(...(res.data.items as Asset[]));
+      cursor = (res.data.nextCursor as string | null) ?? null;
+      setAssets([...items]);
+    } while (cursor);
   }
 
   useEffect(() => {
@@ -76,46 +271,90 @@ export function DashboardPage() {
     if (!me || wsRef.current) return;
     const token = getAccessToken();
     if (!token) return;
-    const wsUrl = `${window.location.origin.replace("http", "ws")}/api/ws/board?token=${token}`;
-    const ws = new WebSocket(wsUrl);
+    const roomId = new URLSearchParams(window.location.search).get("room") || "default";
+    // after a drop, ask only for the revisions we missed
+    const since = revRef.current > 0 ? `&since=${revRef.current}` : "";
+    const wsUrl = `${window.location.origin.replace("http", "ws")}/api/ws/board/${encodeURIComponent(roomId)}?token=${token}${since}`;
+    const ws = new WebSocket(wsUrl, BOARD_PROTOCOLS);
+    ws.binaryType = "arraybuffer";
     wsRef.current = ws;
+    let disposed = false;
+    let reconnectTimer: number | undefined;
+
+    function showBoard(board: BoardSnapshot) {
+      syncedRef.current = board;
+      setSelectedMapId(board.selectedMapId);
+      setPlacedAvatars(board.placedAvatars);
+      setMapViews(board.mapViews);
+    }
 
     ws.onmessage = (event) => {
       try {
-        const message = JSON.parse(event.data);
-        if (message?.type === "state" && message?.payload) {
-          suppressNextSync.current = true;
-          setSelectedMapId(message.payload.selectedMapId ?? "");
+        const message = decodeBoardMessage(event.data);
+        if (message?.type === "hello") {
+          clientIdRef.current = message.clientId ?? null;
+          reconnectAttemptsRef.current = 0;
+        } else if (message?.type === "snapshot" && message?.payload) {
+          revRef.current = message.rev ?? 0;
           const incoming = (message.payload.placedAvatars ?? []) as PlacedAvatar[];
-          setPlacedAvatars(
-            incoming.map((avatar) => ({
-              ...avatar,
-              size: avatar.size ?? 1,
-              hpTotal: avatar.hpTotal ?? 10,
-              hpCurrent: avatar.hpCurrent ?? avatar.hpTotal ?? 10,
-            }))
+          showBoard({
+            selectedMapId: message.payload.selectedMapId ?? "",
+            placedAvatars: incoming.map(normalizeAvatar),
+            mapViews: message.payload.mapViews ?? {},
+          });
+        } else if (message?.type === "patch") {
+          if (message.baseRev !== revRef.current) {
+            // missed a revision: ask for a fresh snapshot instead of guessing
+            sendBoardMessage(ws, { type: "sync" });
+            return;
+          }
+          revRef.current = message.rev;
+          // a tick can merge several writers' ops; each then carries its own origin.
+          // Ours are already applied locally.
+          const ops = ((message.ops ?? []) as (BoardOp & { origin?: string })[]).filter(
+            (op) => (op.origin ?? message.origin) !== clientIdRef.current
           );
-          setMapViews(message.payload.mapViews ?? {});
+          if (ops.length === 0) return;
+          syncedRef.current = applyBoardOps(syncedRef.current, ops);
+          setSelectedMapId((prev) => applyBoardOps({ ...EMPTY_BOARD, selectedMapId: prev }, ops).selectedMapId);
+          setPlacedAvatars((prev) => applyBoardOps({ ...EMPTY_BOARD, placedAvatars: prev }, ops).placedAvatars);
+          setMapViews((prev) => applyBoardOps({ ...EMPTY_BOARD, mapViews: prev }, ops).mapViews);
         }
       } catch {
         // ignore invalid payloads
       }
     };
 
-    ws.onclose = () => {
+    ws.onclose = (event) => {
       if (wsRef.current === ws) {
         wsRef.current = null;
       }
+      if (disposed) return;
+      if (event.code === WS_CLOSE_SESSION_EXPIRED) {
+        // the access token ran out while connected: refresh it and reconnect
+        refreshAccessToken()
+          .then(() => setWsEpoch((epoch) => epoch + 1))
+          .catch(() => {});
+      } else if (!WS_CLOSE_FINAL.has(event.code)) {
+        // network drop or server restart: back off with jitter so a whole
+        // table doesn't reconnect at once
+        const attempt = reconnectAttemptsRef.current++;
+        const delay = Math.min(WS_RECONNECT_MAX_MS, WS_RECONNECT_BASE_MS * 2 ** attempt) * (0.5 + Math.random() / 2);
+        reconnectTimer = window.setTimeout(() => setWsEpoch((epoch) => epoch + 1), delay);
+      }
     };
 
     return () => {
+      disposed = true;
+      window.clearTimeout(reconnectTimer);
       ws.close();
     };
-  }, [me]);
+  }, [me, wsEpoch]);
 
   const previewUrl = useMemo(() => (file ? URL.createObjectURL(file) : null), [file]);
   const maps = useMemo(() => assets.filter((asset) => asset.type === "MAP"), [assets]);
   const avatars = useMemo(() => assets.filter((asset) => asset.type === "AVATAR"), [assets]);
+  const assetsById = useMemo(() => new Map(assets.map((asset) => [asset.id, asset])), [assets]);
   const selectedMap = useMemo(
     () => maps.find((mapAsset) => mapAsset.id === selectedMapId) ?? null,
     [maps, selectedMapId]
@@ -134,6 +373,10 @@ export function DashboardPage() {
     }
     return mapViews[selectedMapId] ?? { scale: 100, x: 50, y: 50 };
   }, [mapViews, selectedMapId]);
+  // the map is drawn at `scale`% of the board width
+  const selectedMapUrl = selectedMap
+    ? pickVariantUrl(selectedMap, ((boardRef.current?.clientWidth || 1024) * currentMapView.scale) / 100)
+    : "";
   const uploadMapView = useMemo(
     () => pendingMapAdjust ?? { scale: 100, x: 50, y: 50 },
     [pendingMapAdjust]
@@ -151,17 +394,19 @@ export function DashboardPage() {
       return;
     }
 
-    const fd = new FormData();
-    fd.append("type", type);
-    fd.append("name", name);
-    fd.append("file", file);
-
     setBusy(true);
     try {
-      const res = await http.post("/assets/upload", fd, {
-        headers: { "Content-Type": "multipart/form-data" },
-      });
-      const createdAsset = res.data as Asset;
+      let createdAsset = await uploadDirect(file, type, name);
+      if (!createdAsset) {
+        const fd = new FormData();
+        fd.append("type", type);
+        fd.append("name", name);
+        fd.append("file", file);
+        const res = await http.post("/assets/upload", fd, {
+          headers: { "Content-Type": "multipart/form-data" },
+        });
+        createdAsset = res.data as Asset;
+      }
       setName("");
       setFile(null);
       if (type === "MAP" && pendingMapAdjust) {
@@ -308,22 +553,13 @@ export function DashboardPage() {
   }
 
   useEffect(() => {
-    if (suppressNextSync.current) {
-      suppressNextSync.current = false;
-      return;
-    }
     const ws = wsRef.current;
     if (!ws || ws.readyState !== WebSocket.OPEN) return;
-    ws.send(
-      JSON.stringify({
-        type: "state",
-        payload: {
-          selectedMapId,
-          placedAvatars,
-          mapViews,
-        },
-      })
-    );
+    const next = { selectedMapId, placedAvatars, mapViews };
+    const ops = diffBoard(syncedRef.current, next);
+    syncedRef.current = next;
+    if (ops.length === 0) return;
+    sendBoardMessage(ws, { type: "ops", ops });
   }, [selectedMapId, placedAvatars, mapViews]);
 
   const isDark = theme === "dark";
@@ -432,7 +668,7 @@ export function DashboardPage() {
             backgroundImage: selectedMap
               ? `linear-gradient(to right, ${gridColor} 1px, transparent 1px),
                  linear-gradient(to bottom, ${gridColor} 1px, transparent 1px),
-                 url(${selectedMap.fileUrl})`
+                 url(${selectedMapUrl})`
               : `linear-gradient(to right, ${gridColor} 1px, transparent 1px),
                  linear-gradient(to bottom, ${gridColor} 1px, transparent 1px)`,
             backgroundSize: selectedMap
@@ -476,7 +712,11 @@ export function DashboardPage() {
               }}
             >
               <img
-                src={avatar.fileUrl}
+                src={
+                  assetsById.has(avatar.assetId)
+                    ? pickVariantUrl(assetsById.get(avatar.assetId)!, GRID_SIZE * avatar.size)
+                    : avatar.fileUrl
+                }
                 alt={avatar.name}
                 style={{ width: "100%", height: "100%", objectFit: "cover", borderRadius: 0 }}
               />
@@ -633,7 +873,7 @@ export function DashboardPage() {
                           }}
                         >
                           <img
-                            src={mapAsset.fileUrl}
+                            src={mapAsset.thumbUrl}
                             alt={mapAsset.name}
                             style={{ width: "100%", height: 72, objectFit: "cover", borderRadius: 12 }}
                           />
@@ -693,7 +933,7 @@ export function DashboardPage() {
                           }}
                         >
                           <img
-                            src={avatar.fileUrl}
+                            src={avatar.thumbUrl}
                             alt={avatar.name}
                             style={{ width: "100%", height: 72, objectFit: "cover", borderRadius: 12 }}
                           />
@@ -852,7 +1092,7 @@ export function DashboardPage() {
                     backgroundColor: isDark ? "#0f0f0f" : "#f8f8f8",
                     backgroundImage: `linear-gradient(to right, ${gridColor} 1px, transparent 1px),
                       linear-gradient(to bottom, ${gridColor} 1px, transparent 1px),
-                      url(${selectedMap.fileUrl})`,
+                      url(${selectedMapUrl})`,
                     backgroundSize: `${GRID_SIZE}px ${GRID_SIZE}px, ${GRID_SIZE}px ${GRID_SIZE}px, ${currentMapView.scale}%`,
                     backgroundPosition: `0 0, 0 0, ${currentMapView.x}% ${currentMapView.y}%`,
                     backgroundRepeat: "no-repeat",
@@ -34,6 +34,22 @@ async function doRefresh(): Promise<string> {
   return res.data.accessToken as string;
 }
 
+// one refresh at a time; concurrent callers share it
+export function refreshAccessToken(): Promise<string> {
+  if (!isRefreshing) {
+    isRefreshing = true;
+    refreshPromise = doRefresh()
+      .then((token) => {
+        setAccessToken(token);
+        return token;
+      })
+      .finally(() => {
+        isRefreshing = false;
+      });
+  }
+  return refreshPromise!;
+}
+
 http.interceptors.response.use(
   (res) => res,
   async (error: AxiosError) => {
@@ -42,20 +58,8 @@ http.interceptors.response.use(
     if (error.response?.status === 401 && !original?._retry) {
       original._retry = true;
 
-      if (!isRefreshing) {
-        isRefreshing = true;
-        refreshPromise = doRefresh()
-          .then((token) => {
-            setAccessToken(token);
-            return token;
-          })
-          .finally(() => {
-            isRefreshing = false;
-          });
-      }
-
       try {
-        const token = await refreshPromise!;
+        const token = await refreshAccessToken();
         original.headers = original.headers ?? {};
         original.headers.Authorization = `Bearer ${token}`;
         return http(original);